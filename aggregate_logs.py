@@ -0,0 +1,222 @@
+# aggregate_logs.py
+# Merges the session logs in the logs directory into one tidy per-trial table.
+#
+# Every enem_blocks_<participant>_<YYYYMMDD_HHMMSS>.csv is classified by its header
+# (log schema v1: question_id; v2: question_number, question_year, ...) and by its
+# phase names (protocol v1: stem/options, v2: question_text/question_full,
+# v3: q_text_on/q_stem_on/q_options_on). Other CSVs in the folder (frame and marker
+# latency summaries) have neither header and are skipped.
+#
+# An index (logs/aggregate/index.json) remembers every ingested file by size, mtime
+# and SHA-256 together with its parsed trials, so a re-run parses only new or changed
+# sessions; a file whose mtime changed but whose content did not is not re-parsed.
+# When a session has a columnar copy (<log>.evlog, columnar_log.py) that is read
+# instead of the CSV.
+#
+# One row per trial: participant, session file, schema/protocol, block, trial,
+# question identity and metadata, ITI, time spent on each phase (summed over
+# revisits), RT of the answer, choice, correctness.
+#
+#   python aggregate_logs.py                       # logs/ -> logs/aggregate/trials.csv
+#   python aggregate_logs.py --logs D:/fnirs/logs -o all_trials.csv --rebuild
+
+import argparse, csv, glob, hashlib, json, os, re, time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INDEX_VERSION = 1
+LOG_NAME = re.compile(r"^enem_blocks_(?P<participant>.+)_(?P<stamp>\d{8}_\d{6})\.csv$")
+
+# phase name -> (protocol, kind); the kinds become the *_s duration columns
+PHASES = {
+    "stem": ("v1", "stem"), "options": ("v1", "options"),
+    "question_text": ("v2", "reading"), "question_full": ("v2", "options"),
+    "q_text_on": ("v3", "reading"), "q_stem_on": ("v3", "stem"), "q_options_on": ("v3", "options"),
+}
+TRIAL_COLUMNS = [
+    "participant", "session_file", "log_schema", "protocol", "block", "trial", "question_id",
+    "question_year", "question_number", "question_type", "question_field", "t_onset",
+    "iti_s", "reading_s", "stem_s", "options_s", "total_s", "revisits",
+    "rt_s", "choice", "correct", "completed",
+]
+
+
+def detect_schema(header):
+    if "question_id" in header: return "v1"
+    if "question_number" in header: return "v2"
+    return None
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _read_rows(path):
+    """(header, rows as dicts); from the columnar copy when there is one."""
+    evlog = path[:-4] + ".evlog"
+    if os.path.exists(evlog) and os.path.getmtime(evlog) >= os.path.getmtime(path) - 5:
+        try:
+            from columnar_log import read_log, csv_rows
+            schema, rows = read_log(evlog)
+            header = [c["name"] for c in schema["columns"]]
+            return header, [dict(zip(header, r)) for r in csv_rows(schema, rows)]
+        except Exception as e:
+            print(f"[AGG] {os.path.basename(evlog)} unreadable ({e}); using the CSV")
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f)
+        return reader.fieldnames or [], list(reader)
+
+
+def _float(s):
+    try: return float(s)
+    except (TypeError, ValueError): return None
+
+
+def parse_session(path):
+    """(log_schema, protocol, [trial dicts]) for one log; schema None if not a session log."""
+    header, rows = _read_rows(path)
+    schema = detect_schema(header)
+    if schema is None: return None, None, []
+    m = LOG_NAME.match(os.path.basename(path))
+    participant = m.group("participant") if m else ""
+    protocol = next((PHASES[r["phase"]][0] for r in rows if r.get("phase") in PHASES), "")
+
+    trials, order = {}, []
+    for r in rows:
+        trial_idx = r.get("trial_idx_in_block", "")
+        if trial_idx in ("", "-1"): continue
+        key = (r.get("block", ""), trial_idx)
+        tr = trials.get(key)
+        if tr is None:
+            qid = r.get("question_id") if schema == "v1" else "_".join(
+                x for x in (r.get("question_year", ""), r.get("question_number", "")) if x)
+            tr = trials[key] = {
+                "participant": participant, "session_file": os.path.basename(path), "log_schema": schema,
+                "protocol": protocol, "block": key[0], "trial": int(trial_idx), "question_id": qid,
+                "question_year": r.get("question_year", ""), "question_number": r.get("question_number", ""),
+                "question_type": r.get("question_type", ""), "question_field": r.get("question_field", ""),
+                "t_onset": None, "iti_s": None, "reading_s": None, "stem_s": None, "options_s": None,
+                "total_s": None, "revisits": 0, "rt_s": None, "choice": "", "correct": "", "completed": False,
+                "_open": None,   # (kind, t) of the phase on screen
+            }
+            order.append(key)
+        t, phase = _float(r.get("t_abs")), r.get("phase", "")
+        if t is None: continue
+        if phase == "iti":
+            tr["iti_s"] = _float(r.get("rt_from_phase"))
+            continue
+        if tr["_open"] is not None and (phase in PHASES or phase in ("answer", "back_to_text")):
+            kind, t0 = tr["_open"]
+            tr[f"{kind}_s"] = (tr[f"{kind}_s"] or 0.0) + (t - t0)
+            tr["_open"] = None
+        if phase in PHASES:
+            if tr["t_onset"] is None: tr["t_onset"] = t
+            tr["_open"] = (PHASES[phase][1], t)
+        elif phase == "back_to_text":
+            tr["revisits"] += 1
+        elif phase == "answer":
+            tr["rt_s"] = _float(r.get("rt_from_phase"))
+            tr["choice"], tr["correct"] = r.get("choice", ""), r.get("correct", "")
+            tr["completed"] = True
+            if tr["t_onset"] is not None: tr["total_s"] = t - tr["t_onset"]
+    out = []
+    for key in order:
+        tr = trials[key]; del tr["_open"]
+        out.append(tr)
+    return schema, protocol, out
+
+
+# ===== index =====
+def load_index(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            idx = json.load(f)
+        if idx.get("version") == INDEX_VERSION: return idx
+    except (OSError, ValueError):
+        pass
+    return {"version": INDEX_VERSION, "files": {}}
+
+
+def save_index(idx, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(idx, f)
+    os.replace(tmp, path)   # a crash mid-write keeps the old index
+
+
+def session_logs(log_dir):
+    """Session CSVs in log_dir (not the frame/latency summaries or converted copies)."""
+    return [p for p in sorted(glob.glob(os.path.join(log_dir, "enem_blocks_*.csv")))
+            if LOG_NAME.match(os.path.basename(p))]
+
+
+def scan(log_dir, idx):
+    """Updates idx in place from log_dir; returns counts of parsed/reused/skipped files."""
+    counts = {"parsed": 0, "reused": 0, "skipped": 0, "removed": 0}
+    seen = set()
+    for path in session_logs(log_dir):
+        name = os.path.basename(path)
+        seen.add(name)
+        st = os.stat(path)
+        entry = idx["files"].get(name)
+        if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+            counts["reused"] += 1; continue
+        digest = file_sha256(path)
+        if entry and entry["sha256"] == digest:
+            entry["mtime"] = st.st_mtime; counts["reused"] += 1; continue
+        schema, protocol, trials = parse_session(path)
+        if schema is None:
+            counts["skipped"] += 1
+        else:
+            counts["parsed"] += 1
+        idx["files"][name] = {"size": st.st_size, "mtime": st.st_mtime, "sha256": digest,
+                              "schema": schema, "protocol": protocol, "trials": trials}
+    for name in [n for n in idx["files"] if n not in seen]:
+        del idx["files"][name]; counts["removed"] += 1
+    return counts
+
+
+def write_trials(idx, out_path):
+    n = 0
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(out_path, "w", encoding="utf-8", newline="") as f:
+        w = csv.DictWriter(f, TRIAL_COLUMNS)
+        w.writeheader()
+        for name in sorted(idx["files"]):
+            for tr in idx["files"][name]["trials"]:
+                w.writerow({k: ("" if v is None else f"{v:.6f}" if isinstance(v, float) else v)
+                            for k, v in tr.items()})
+                n += 1
+    return n
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Merge session logs into one per-trial table.")
+    ap.add_argument("--logs", default=os.path.join(BASE_DIR, "logs"), help="logs directory")
+    ap.add_argument("-o", "--out", default=None, help="trial table (default <logs>/aggregate/trials.csv)")
+    ap.add_argument("--index", default=None, help="index file (default <logs>/aggregate/index.json)")
+    ap.add_argument("--rebuild", action="store_true", help="ignore the index and parse every file")
+    args = ap.parse_args()
+
+    index_path = args.index or os.path.join(args.logs, "aggregate", "index.json")
+    out = args.out or os.path.join(args.logs, "aggregate", "trials.csv")
+    t0 = time.perf_counter()
+    idx = {"version": INDEX_VERSION, "files": {}} if args.rebuild else load_index(index_path)
+    counts = scan(args.logs, idx)
+    save_index(idx, index_path)
+    n = write_trials(idx, out)
+    by = {}
+    for e in idx["files"].values():
+        if e["schema"]: by[f"{e['schema']}/{e['protocol'] or '?'}"] = by.get(f"{e['schema']}/{e['protocol'] or '?'}", 0) + 1
+    print(f"[AGG] {len(idx['files'])} files ({counts['parsed']} parsed, {counts['reused']} from index, "
+          f"{counts['skipped']} not session logs, {counts['removed']} gone) in {time.perf_counter() - t0:.2f}s")
+    print("[AGG] schema/protocol: " + (", ".join(f"{k}={v}" for k, v in sorted(by.items())) or "none"))
+    print(f"[AGG] {n} trials -> {out}")
+
+
+if __name__ == "__main__":
+    main()
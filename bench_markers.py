@@ -0,0 +1,192 @@
+# bench_markers.py
+# Marker round-trip benchmark: send_marker path -> LSL outlet -> local StreamInlet.
+#
+# Sends through the path the experiment uses (markers.open_markers(["lsl"]): MarkerHub.send,
+# the LSLBackend's bounded queue and its sender thread) with the experiment's stream
+# name/type (own source_id, so a running experiment is never picked up by mistake), reads
+# an inlet on the same machine, fires markers in the patterns the experiment produces
+# and measures, per marker:
+#   call_us   cost of MarkerHub.send() on the sending thread (the frame loop's cost)
+#   lat_ms    local_clock() at arrival in the inlet minus the hub's timestamp
+#             (queue wait, sender thread wake-up, push and transport)
+#   queue_ms  enqueue -> push_sample() returned, as the backend measures it
+# Patterns:
+#   steady  single markers at --rate Hz (phase onsets, answers)
+#   burst   BUTTON_CLICK immediately followed by Q_STEM_ON (a reveal), pairs at --rate Hz
+# Jitter is the standard deviation of lat_ms; for bursts also the arrival gap of the pair.
+# TTL pulses cannot be looped back without hardware, so only LSL is measured.
+#
+# Results go to bench/markers_<host>_<time>.json together with the machine, pylsl/liblsl
+# versions and git revision, so runs can be compared across code versions and lab PCs:
+#   python bench_markers.py -n 2000 --rate 50
+#   python bench_markers.py --compare bench/markers_A.json bench/markers_B.json
+
+import argparse, json, os, platform, socket, statistics, subprocess, sys, threading, time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+OUT_DIR = os.path.join(BASE_DIR, "bench")
+
+# same stream as the experiment configs (markers.lsl_stream_name/type)
+LSL_STREAM_NAME = "psychopy_markers"
+LSL_STREAM_TYPE = "Markers"
+
+
+def _pct(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p / 100.0 * (len(xs) - 1))))] if xs else None
+
+
+def _stats(xs):
+    if not xs: return {"n": 0}
+    return {"n": len(xs), "mean": statistics.mean(xs), "p50": _pct(xs, 50), "p95": _pct(xs, 95),
+            "p99": _pct(xs, 99), "max": max(xs), "std": statistics.pstdev(xs)}
+
+
+class Receiver:
+    """Pulls from the inlet on its own thread and stamps every arrival with local_clock()."""
+
+    def __init__(self, inlet, local_clock):
+        self.inlet, self.clock = inlet, local_clock
+        self.arrivals = {}
+        self.stop = False
+        self.thread = threading.Thread(target=self._run, name="bench-inlet", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stop:
+            sample, ts = self.inlet.pull_sample(timeout=0.1)
+            if sample is None: continue
+            self.arrivals[sample[0]] = self.clock()
+
+
+def run_pattern(hub, receiver, pattern, n, rate, warmup=20):
+    """Sends n markers (n/2 pairs for bursts) through the hub; returns the per-pattern result dict."""
+    period = 1.0 / rate
+    sent = []   # (tag, hub timestamp, call_secs, pair_index)
+    groups = [["BUTTON_CLICK", "Q_STEM_ON"]] if pattern == "burst" else [["Q_TEXT_ON"]]
+    n_groups = max(1, n // len(groups[0]))
+    t_next = time.perf_counter()
+    for g in range(-warmup, n_groups):
+        while time.perf_counter() < t_next: time.sleep(min(0.001, max(0.0, t_next - time.perf_counter())))
+        t_next += period
+        for name in groups[0]:
+            tag = f"{name}#{pattern}{g}"
+            c0 = time.perf_counter()
+            t0 = hub.send(tag, 0)
+            call = time.perf_counter() - c0
+            if g >= 0: sent.append((tag, t0, call, g))
+    deadline = time.perf_counter() + 2.0
+    while time.perf_counter() < deadline and any(tag not in receiver.arrivals for tag, *_ in sent):
+        time.sleep(0.01)
+
+    queued = {tag: lat for tag, _, lat in list(hub.backends[0].sent)}
+    lat, calls, lost, pair_gap, queue_ms = [], [], 0, [], []
+    by_pair = {}
+    for tag, t0, call, g in sent:
+        calls.append(call * 1e6)
+        if tag in queued: queue_ms.append(queued[tag] * 1000.0)
+        t_arr = receiver.arrivals.get(tag)
+        if t_arr is None: lost += 1; continue
+        lat.append((t_arr - t0) * 1000.0)
+        by_pair.setdefault(g, []).append(t_arr)
+    if pattern == "burst":
+        pair_gap = [(ts[1] - ts[0]) * 1000.0 for ts in by_pair.values() if len(ts) == 2]
+    out = {"pattern": pattern, "rate_hz": rate, "sent": len(sent), "lost": lost,
+           "lat_ms": _stats(lat), "call_us": _stats(calls), "queue_ms": _stats(queue_ms)}
+    if pattern == "burst": out["pair_gap_ms"] = _stats(pair_gap)
+    return out
+
+
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def machine_info(pylsl):
+    info = {"host": socket.gethostname(), "platform": platform.platform(), "python": sys.version.split()[0],
+            "cpu": platform.processor(), "git": _git_rev()}
+    try:
+        info["pylsl"] = getattr(pylsl, "__version__", None)
+        info["liblsl"] = pylsl.library_version()
+    except Exception:
+        pass
+    return info
+
+
+def run_bench(n, rate, patterns):
+    from pylsl import StreamInlet, resolve_byprop, local_clock
+    import pylsl
+    from markers import open_markers
+    source_id = f"bench_{os.getpid()}_{int(time.time())}"
+    hub = open_markers(["lsl"], clock=local_clock, lsl_name=LSL_STREAM_NAME, lsl_type=LSL_STREAM_TYPE,
+                       lsl_source_id=source_id)
+    if not hub: raise RuntimeError(f"could not open the LSL marker backend: {hub.failed}")
+    found = resolve_byprop("source_id", source_id, timeout=5.0)
+    if not found: hub.close(); raise RuntimeError("benchmark outlet not visible to a local resolver")
+    inlet = StreamInlet(found[0], max_buflen=60)
+    inlet.open_stream(timeout=5.0)
+    receiver = Receiver(inlet, local_clock)
+    time.sleep(0.5)   # let the connection settle before measuring
+    try:
+        results = [run_pattern(hub, receiver, p, n, rate) for p in patterns]
+    finally:
+        receiver.stop = True; receiver.thread.join(1.0)
+        hub.close()
+    return {"created": time.strftime("%Y-%m-%d %H:%M:%S"), "machine": machine_info(pylsl),
+            "stream": {"name": LSL_STREAM_NAME, "type": LSL_STREAM_TYPE}, "n": n, "results": results}
+
+
+def print_result(r):
+    lat, call, q = r["lat_ms"], r["call_us"], r.get("queue_ms", {})
+    line = (f"{r['pattern']:<7} {r['rate_hz']:>6.1f}Hz sent={r['sent']:<6} lost={r['lost']:<4} "
+            f"call_mean={call.get('mean', 0):.1f}us")
+    if q.get("n"): line += f" queue mean={q['mean']:.3f} p95={q['p95']:.3f} ms"
+    if lat["n"]:
+        line += (f" lat mean={lat['mean']:.3f} p50={lat['p50']:.3f} p95={lat['p95']:.3f} "
+                 f"p99={lat['p99']:.3f} max={lat['max']:.3f} jitter={lat['std']:.3f} ms")
+    if r.get("pair_gap_ms", {}).get("n"):
+        g = r["pair_gap_ms"]
+        line += f" | pair gap mean={g['mean']:.3f} p95={g['p95']:.3f} ms"
+    print(line)
+
+
+def compare(paths):
+    runs = []
+    for p in paths:
+        with open(p, "r", encoding="utf-8") as f:
+            runs.append((p, json.load(f)))
+    print(f"{'run':<40} {'pattern':<7} {'lat_p50':>8} {'lat_p95':>8} {'lat_p99':>8} {'jitter':>7} {'call_us':>8} {'lost':>5}")
+    for p, run in runs:
+        label = f"{run['machine'].get('host', '?')}@{run['machine'].get('git') or '?'}"
+        for r in run["results"]:
+            lat = r["lat_ms"]
+            print(f"{label:<40} {r['pattern']:<7} {lat.get('p50', float('nan')):>8.3f} "
+                  f"{lat.get('p95', float('nan')):>8.3f} {lat.get('p99', float('nan')):>8.3f} "
+                  f"{lat.get('std', float('nan')):>7.3f} {r['call_us'].get('mean', float('nan')):>8.1f} {r['lost']:>5}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="LSL marker round-trip benchmark (outlet -> local inlet).")
+    ap.add_argument("-n", type=int, default=2000, help="markers per pattern")
+    ap.add_argument("--rate", type=float, default=50.0, help="markers (or burst pairs) per second")
+    ap.add_argument("--patterns", default="steady,burst")
+    ap.add_argument("-o", "--out", default=None, help="result JSON (default bench/markers_<host>_<time>.json)")
+    ap.add_argument("--compare", nargs="+", metavar="JSON", help="print saved runs side by side and exit")
+    args = ap.parse_args()
+
+    if args.compare:
+        compare(args.compare); return
+    result = run_bench(args.n, args.rate, [p.strip() for p in args.patterns.split(",") if p.strip()])
+    for r in result["results"]: print_result(r)
+    out = args.out or os.path.join(OUT_DIR, f"markers_{result['machine']['host']}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=1)
+    print(f"[BENCH] results -> {out}")
+
+
+if __name__ == "__main__":
+    main()
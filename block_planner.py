@@ -0,0 +1,140 @@
+# block_planner.py
+# Assigns questions of one type to fixed-size blocks so that the summed expected
+# duration of each block fits its time budget and the fields (CH / LC) are spread
+# evenly over the blocks.
+#
+# Items are the metadata dicts from QuestionBank.index() (year, color,
+# question_number, type, field, time). The plan is a greedy fill followed by a
+# bounded local search (swaps between blocks, and swaps with unused items of
+# the same field, so the field mix of the selection is kept). Each move only
+# re-scores the blocks it touches, and the search stops once it stalls, so banks
+# of thousands of items plan in well under a second. The search is bounded by
+# iterations, not wall-clock time, so a seed gives the same plan on any machine
+# (time_limit is opt-in and gives up that guarantee).
+
+import random, time
+
+W_OVERRUN = 100.0   # per s^2 of a block going over budget (gets cut by run_block)
+W_IDLE = 1.0        # per s^2 of a block finishing early (long rest)
+W_FIELD = 2000.0    # per squared deviation from the even per-block field count
+
+
+def item_cost(item, overhead, default_time):
+    t = item.get("time")
+    return (default_time if t is None else float(t)) + overhead
+
+
+class _Plan:
+    def __init__(self, blocks, costs, fields, budget, field_share):
+        self.blocks = blocks            # list of lists of item indices
+        self.costs, self.fields = costs, fields
+        self.budget, self.field_share = budget, field_share
+
+    def block_score(self, blk):
+        load = sum(self.costs[i] for i in blk)
+        over = max(0.0, load - self.budget); idle = max(0.0, self.budget - load)
+        counts = {}
+        for i in blk: counts[self.fields[i]] = counts.get(self.fields[i], 0) + 1
+        imbalance = sum((counts.get(f, 0) - share) ** 2 for f, share in self.field_share.items())
+        return W_OVERRUN * over * over + W_IDLE * idle * idle + W_FIELD * imbalance
+
+
+def _select(pool, need, fields, rng):
+    """Pick `need` indices, spreading the selection over fields as evenly as availability allows."""
+    by_field = {}
+    for i in pool: by_field.setdefault(fields[i], []).append(i)
+    for lst in by_field.values(): rng.shuffle(lst)
+    quota = {f: 0 for f in by_field}
+    left = need
+    while left > 0:
+        open_fields = [f for f in by_field if quota[f] < len(by_field[f])]
+        if not open_fields: break
+        share = max(1, left // len(open_fields))
+        for f in sorted(open_fields, key=lambda f: len(by_field[f]) - quota[f]):
+            take = min(share, len(by_field[f]) - quota[f], left)
+            quota[f] += take; left -= take
+            if left == 0: break
+    chosen = [i for f in by_field for i in by_field[f][:quota[f]]]
+    unused = [i for f in by_field for i in by_field[f][quota[f]:]]
+    return chosen, unused
+
+
+def plan_blocks(items, n_blocks, per_block, budget_secs, overhead_secs=0.0,
+                default_time=120.0, rng=None, time_limit=None, max_iters=50000, patience=3000):
+    """Returns (blocks, info). blocks is a list of n_blocks lists of items; info has the
+    objective score and per-block expected load and field counts."""
+    rng = rng or random
+    costs = [item_cost(q, overhead_secs, default_time) for q in items]
+    fields = [q.get("field") or "" for q in items]
+    need = min(len(items), n_blocks * per_block)
+
+    # items that can never fit a block on their own are only used as a last resort
+    fitting = [i for i in range(len(items)) if costs[i] <= budget_secs]
+    pool = fitting if len(fitting) >= need else list(range(len(items)))
+    chosen, unused = _select(pool, need, fields, rng)
+
+    field_counts = {}
+    for i in chosen: field_counts[fields[i]] = field_counts.get(fields[i], 0) + 1
+    field_share = {f: c / float(n_blocks) for f, c in field_counts.items()}
+
+    # greedy: longest first into the least loaded block that still has room
+    blocks = [[] for _ in range(n_blocks)]
+    loads = [0.0] * n_blocks
+    for i in sorted(chosen, key=lambda i: -costs[i]):
+        open_b = [b for b in range(n_blocks) if len(blocks[b]) < per_block]
+        b = min(open_b, key=lambda b: (sum(1 for j in blocks[b] if fields[j] == fields[i]), loads[b]))
+        blocks[b].append(i); loads[b] += costs[i]
+
+    plan = _Plan(blocks, costs, fields, budget_secs, field_share)
+    scores = [plan.block_score(b) for b in blocks]
+    spare = {}
+    for i in unused: spare.setdefault(fields[i], []).append(i)
+
+    # local search
+    t_end = time.perf_counter() + time_limit if time_limit is not None else None
+    it = stall = 0
+    while it < max_iters and stall < patience and (t_end is None or time.perf_counter() < t_end):
+        it += 1; stall += 1
+        b1 = rng.randrange(n_blocks)
+        if not blocks[b1]: continue
+        p1 = rng.randrange(len(blocks[b1]))
+        old = blocks[b1][p1]
+        same_field = spare.get(fields[old])
+        if same_field and rng.random() < 0.3:
+            u = rng.randrange(len(same_field))
+            blocks[b1][p1] = same_field[u]
+            s1 = plan.block_score(blocks[b1])
+            if s1 < scores[b1]:
+                scores[b1] = s1; same_field[u] = old; stall = 0
+            else:
+                blocks[b1][p1] = old
+            continue
+        b2 = rng.randrange(n_blocks)
+        if b2 == b1 or not blocks[b2]: continue
+        p2 = rng.randrange(len(blocks[b2]))
+        blocks[b1][p1], blocks[b2][p2] = blocks[b2][p2], blocks[b1][p1]
+        s1, s2 = plan.block_score(blocks[b1]), plan.block_score(blocks[b2])
+        if s1 + s2 < scores[b1] + scores[b2]:
+            scores[b1], scores[b2] = s1, s2; stall = 0
+        else:
+            blocks[b1][p1], blocks[b2][p2] = blocks[b2][p2], blocks[b1][p1]
+
+    for blk in blocks: rng.shuffle(blk)   # presentation order within a block stays random
+    info = {
+        "score": sum(scores), "iterations": it, "budget": budget_secs,
+        "loads": [sum(costs[i] for i in blk) for blk in blocks],
+        "fields": [_count(fields[i] for i in blk) for blk in blocks],
+    }
+    return [[items[i] for i in blk] for blk in blocks], info
+
+
+def _count(xs):
+    out = {}
+    for x in xs: out[x] = out.get(x, 0) + 1
+    return out
+
+
+def describe_block(label, items, load, fields):
+    keys = ", ".join(f"{q['year']}/{q['color']}/{q['question_number']}" for q in items)
+    fc = " ".join(f"{f}={n}" for f, n in sorted(fields.items()))
+    return f"{label}: {keys}; expected {load:.0f}s; {fc}"
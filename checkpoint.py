@@ -0,0 +1,75 @@
+# checkpoint.py
+# Session checkpoints for crash/escape recovery.
+#
+# The experiment calls save(state) after every trial. save() only serializes the
+# (small) state and hands the string to a writer thread; only the newest snapshot is
+# written, atomically (temp file + os.replace), so the trial loop never waits on disk
+# and a crash mid-write cannot leave a half-written checkpoint behind.
+
+import atexit, json, os, random, threading
+
+
+def rng_state():
+    """random's global state as JSON-friendly lists."""
+    version, internal, gauss = random.getstate()
+    return [version, list(internal), gauss]
+
+
+def set_rng_state(state):
+    version, internal, gauss = state
+    random.setstate((version, tuple(internal), gauss))
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path): return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[CKPT] Could not read {path}: {e}")
+        return None
+
+
+class Checkpointer:
+    def __init__(self, path):
+        self.path = path
+        self._pending = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="checkpoint", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def save(self, state):
+        data = json.dumps(state, ensure_ascii=False)
+        with self._lock: self._pending = data
+        self._wake.set()
+
+    def close(self):
+        """Write the last pending snapshot and stop the thread. Idempotent."""
+        if self._stop: return
+        self._stop = True
+        atexit.unregister(self.close)
+        self._wake.set()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                data, self._pending = self._pending, None
+            if data is not None:
+                self._write(data)
+            if self._stop and self._pending is None:
+                return
+
+    def _write(self, data):
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(data); f.flush(); os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print("[CKPT] write error:", e)
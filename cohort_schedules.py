@@ -0,0 +1,134 @@
+# cohort_schedules.py
+# Precomputed, counterbalanced session schedules for a whole participant cohort.
+#
+# One pass plans the concrete and abstract blocks once (block_planner, with the block
+# settings of the experiment config) and then derives every participant's schedule from it:
+#   - block type order (concrete first / abstract first) alternates by participant,
+#   - the order of the blocks within each type follows a Williams (balanced Latin)
+#     square, so every block appears at every position and after every other block
+#     equally often,
+#   - item positions inside a block are rotated cyclically (Latin square over positions).
+# Each participant also gets a fixed RNG seed (ITI draws etc.), so a session can be
+# reproduced. The experiment looks the participant ID up with lookup_schedule(), which
+# ignores a schedule planned with other block settings than the running config's.
+#
+#   python cohort_schedules.py questions_with_time.json -n 60 [--config configs/v3.json]
+#          [--set '{"blocks.duration_secs": 360}'] [-o schedules/cohort.json]
+
+import argparse, json, os, random, time
+
+from question_bank import QuestionBank, source_hash
+from block_planner import plan_blocks
+from enem_engine.config import BASE_DIR, item_overhead_secs, load_config, resolve_path
+
+SCHEDULE_VERSION = 1
+
+
+def williams_orders(n):
+    """Rows of a Williams design for n conditions (2n rows when n is odd)."""
+    first = [0] + [(j + 1) // 2 if j % 2 else n - j // 2 for j in range(1, n)]
+    rows = [[(x + r) % n for x in first] for r in range(n)]
+    if n % 2: rows += [row[::-1] for row in rows]
+    return rows
+
+
+def _key(q):
+    return [q["year"], q["color"], q["question_number"]]
+
+
+def plan_settings(cfg):
+    """The block settings a schedule is planned with, from an experiment config."""
+    b = cfg["blocks"]
+    return {"blocks_per_type": b["per_type"], "questions_per_block": b["questions_per_block"],
+            "block_secs": b["duration_secs"], "overhead_secs": item_overhead_secs(cfg),
+            "default_time": b["default_item_secs"]}
+
+
+def build_schedules(bank, participant_ids, seed, settings):
+    blocks_per_type, questions_per_block = settings["blocks_per_type"], settings["questions_per_block"]
+    rng = random.Random(seed)
+    base = {}
+    for tag, qtype in (("C", "concrete"), ("A", "abstract")):
+        pool = bank.index(type=qtype)
+        rng.shuffle(pool)
+        blocks, info = plan_blocks(pool, blocks_per_type, questions_per_block, settings["block_secs"],
+                                   settings["overhead_secs"], settings["default_time"], rng=rng)
+        base[tag] = {"blocks": [[_key(q) for q in blk] for blk in blocks], "score": info["score"],
+                     "loads": info["loads"]}
+
+    orders = williams_orders(blocks_per_type)
+    participants = {}
+    for p, pid in enumerate(participant_ids):
+        type_order = ["C", "A"] if p % 2 == 0 else ["A", "C"]
+        block_order = orders[(p // 2) % len(orders)]
+        shift = (p // 2) % questions_per_block
+        plan = []
+        for tag in type_order:
+            for b in block_order:
+                keys = base[tag]["blocks"][b]
+                keys = keys[shift % len(keys):] + keys[:shift % len(keys)] if keys else keys
+                plan.append([tag, b + 1, keys])   # label keeps the base block id (C3 = same items)
+        participants[str(pid)] = {"seed": rng.randrange(2 ** 31), "first": type_order[0], "blocks": plan}
+
+    return {
+        "version": SCHEDULE_VERSION, "created": time.strftime("%Y-%m-%d %H:%M:%S"), "seed": seed,
+        "config": dict(settings),
+        "base_blocks": base, "participants": participants,
+    }
+
+
+def lookup_schedule(path, participant, source_json=None, settings=None):
+    """The participant's entry from a schedule file, or None (missing file/ID, or the
+    schedule was built from a different version of the question bank or with other
+    block settings than plan_settings() of the running config)."""
+    if not path or not os.path.exists(path): return None
+    with open(path, "r", encoding="utf-8") as f:
+        sched = json.load(f)
+    entry = sched.get("participants", {}).get(str(participant))
+    if entry is None: return None
+    if source_json and sched.get("source_sha256") not in (None, source_hash(source_json)):
+        print(f"[SCHEDULE] {path} was built from a different question bank; ignoring it.")
+        return None
+    if settings is not None and sched.get("config") != settings:
+        diff = ", ".join(f"{k} {sched.get('config', {}).get(k)!r} != {v!r}" for k, v in settings.items()
+                         if sched.get("config", {}).get(k) != v)
+        print(f"[SCHEDULE] {path} was planned with other block settings ({diff}); ignoring it.")
+        return None
+    return entry
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Precompute counterbalanced schedules for a cohort.")
+    ap.add_argument("questions_json")
+    ap.add_argument("-n", "--participants", type=int, default=60)
+    ap.add_argument("--start", type=int, default=1, help="first participant number")
+    ap.add_argument("--prefix", default="", help="prefix for participant IDs, e.g. P")
+    ap.add_argument("--width", type=int, default=0, help="zero-pad participant numbers to this width")
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--config", default=os.path.join(BASE_DIR, "configs", "v3.json"),
+                    help="experiment config with the block settings")
+    ap.add_argument("--set", default=None, help="JSON object of dotted config overrides")
+    ap.add_argument("-o", "--out", default=None,
+                    help="schedule file (default: the config's blocks.schedule_file)")
+    args = ap.parse_args()
+    cfg = load_config(args.config, json.loads(args.set) if args.set else None)
+    settings = plan_settings(cfg)
+    out = resolve_path(args.out or cfg["blocks"]["schedule_file"] or os.path.join("schedules", "cohort.json"))
+
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 31)
+    ids = [f"{args.prefix}{i:0{args.width}d}" if args.width else f"{args.prefix}{i}"
+           for i in range(args.start, args.start + args.participants)]
+    t0 = time.perf_counter()
+    bank = QuestionBank.from_json(args.questions_json)
+    sched = build_schedules(bank, ids, seed, settings)
+    sched["source_sha256"] = source_hash(args.questions_json)
+    bank.close()
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(sched, f, indent=1)
+    print(f"[SCHEDULE] {len(ids)} participants (seed {seed}) -> {out} "
+          f"in {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
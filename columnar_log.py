@@ -0,0 +1,211 @@
+# columnar_log.py
+# Append-only binary session log written next to the CSV (<log>.evlog).
+#
+# Same rows as the CSV event log (it is fed by the same log_event call), stored as
+# typed records: timestamps and RTs as float64, indices and marker codes as int64 and
+# every other column dictionary-encoded (each distinct string is stored once, so the
+# question metadata repeated on every row costs 4 bytes). Writing happens on the
+# EventLog writer thread in zlib-compressed chunks of CHUNK_ROWS rows; sync() (block
+# boundaries) and close() write out the rows of a partial chunk. The CSV stays the
+# row-by-row record, the columnar file the analysis copy.
+#
+#   file   = MAGIC, u32 schema length, schema JSON, chunk*
+#   chunk  = "<4sIIII" (b"CHNK", n_strings, n_typed, n_raw, payload bytes), zlib(payload)
+#   payload = new strings (u32 length + UTF-8)*, typed rows (fixed struct)*,
+#             raw rows (u32 position in chunk, u32 n cells, u32 string id per cell)*
+#
+# A value that would not come back byte-identical from its typed column (e.g. a
+# float that was not pre-formatted) makes its row a raw row of string ids, so the
+# converter reproduces the CSV exactly. A truncated last chunk (crash mid-write) is
+# ignored by the reader.
+#
+#   python columnar_log.py logs/enem_blocks_P01_x.evlog [-o out.csv] [--check original.csv]
+
+import argparse, csv, json, math, os, struct, sys, time, zlib
+
+from event_log import EventLog
+
+MAGIC = b"ENEMEVL1"
+CHUNK = struct.Struct("<4sIIII")
+U32 = struct.Struct("<I")
+SCHEMA_VERSION = 1
+# column -> (type, CSV format); "" in a float column is stored as NaN
+TYPED_COLUMNS = {
+    "t_abs": ("f64", ".6f"),
+    "rt_from_phase": ("f64", "r"),
+    "button_click_time": ("f64", ".6f"),
+    "option_view_time": ("f64", ".6f"),
+    "trial_idx_in_block": ("i64", None),
+    "marker_code": ("i64", None),
+}
+_STRUCT_CODES = {"f64": "d", "i64": "q", "str": "I"}
+CHUNK_ROWS = 512   # rows per compressed chunk; sync() and close() write the rest
+MISSING = None     # cell past the end of a short raw row (csv_rows drops it)
+
+
+def column_types(header):
+    return [TYPED_COLUMNS.get(name, ("str", None)) for name in header]
+
+
+def _format_float(x, fmt):
+    if math.isnan(x): return ""
+    return repr(x) if fmt == "r" else format(x, fmt)
+
+
+def _csv_text(v):
+    # what csv.writer writes for v
+    return "" if v is None else v if isinstance(v, str) else str(v)
+
+
+class ColumnarLog(EventLog):
+    """EventLog with the binary record format; same writerow/sync/close interface."""
+
+    def _open(self, path):
+        self.types = column_types(self.header)
+        self._row = struct.Struct("<" + "".join(_STRUCT_CODES[t] for t, _ in self.types))
+        self._ids = {}
+        self._pending = []   # (typed?, packed row, position) since the last chunk
+        self._new = []       # strings first used since the last chunk
+        schema = json.dumps({
+            "version": SCHEMA_VERSION, "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "columns": [{"name": n, "type": t, "format": fmt} for n, (t, fmt) in zip(self.header, self.types)],
+        }).encode("utf-8")
+        f = open(path, "wb")
+        f.write(MAGIC + U32.pack(len(schema)) + schema)
+        return f
+
+    def _begin(self):
+        pass   # the header is part of the schema
+
+    def _sid(self, s):
+        i = self._ids.get(s)
+        if i is None:
+            i = self._ids[s] = len(self._ids)
+            b = s.encode("utf-8")
+            self._new.append(U32.pack(len(b)) + b)
+        return i
+
+    def _typed(self, row):
+        vals = []
+        for (kind, fmt), v in zip(self.types, row):
+            if kind == "str":
+                vals.append(self._sid(_csv_text(v))); continue
+            if kind == "i64":
+                if type(v) is not int: return None
+                vals.append(v); continue
+            text = _csv_text(v)
+            try:
+                x = float(text) if text != "" else math.nan
+            except ValueError:
+                return None
+            if _format_float(x, fmt) != text or (text != "" and math.isnan(x)):
+                return None
+            vals.append(x)
+        return vals
+
+    def _write_rows(self, rows):
+        for row in rows:
+            vals = self._typed(row) if len(row) == len(self.types) else None
+            if vals is not None:
+                self._pending.append((True, self._row.pack(*vals)))
+            else:
+                ids = [self._sid(_csv_text(v)) for v in row]
+                self._pending.append((False, struct.pack(f"<II{len(ids)}I", len(self._pending), len(ids), *ids)))
+            if len(self._pending) >= CHUNK_ROWS: self._write_chunk()
+
+    def _write_chunk(self):
+        if not self._pending: return
+        typed = [b for is_typed, b in self._pending if is_typed]
+        raw = [b for is_typed, b in self._pending if not is_typed]
+        payload = zlib.compress(b"".join(self._new) + b"".join(typed) + b"".join(raw), 1)
+        try:
+            self._f.write(CHUNK.pack(b"CHNK", len(self._new), len(typed), len(raw), len(payload)) + payload)
+        except Exception as e:
+            print("[LOG] write error:", e)
+        self._pending, self._new = [], []
+
+    def _sync_file(self):
+        self._write_chunk()
+        super()._sync_file()
+
+
+# ===== reading =====
+def read_columns(path):
+    """(schema, {column: list}) in log order: str columns as strings, float columns as
+    floats (NaN for empty), int columns as ints; values of raw rows stay CSV text.
+    A whole session reads in a few ms."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:len(MAGIC)] != MAGIC: raise ValueError(f"{path}: not a columnar event log")
+    off = len(MAGIC)
+    (n,) = U32.unpack_from(data, off); off += 4
+    schema = json.loads(data[off:off + n]); off += n
+    types = [c["type"] for c in schema["columns"]]
+    row_s = struct.Struct("<" + "".join(_STRUCT_CODES[t] for t in types))
+    cols = [[] for _ in types]
+    strings = []
+    while off + CHUNK.size <= len(data):
+        tag, n_str, n_typed, n_raw, size = CHUNK.unpack_from(data, off)
+        if tag != b"CHNK" or off + CHUNK.size + size > len(data): break   # truncated tail
+        body = zlib.decompress(data[off + CHUNK.size:off + CHUNK.size + size])
+        off += CHUNK.size + size
+        p = 0
+        for _ in range(n_str):
+            (ln,) = U32.unpack_from(body, p); p += 4
+            strings.append(body[p:p + ln].decode("utf-8")); p += ln
+        end = p + n_typed * row_s.size
+        chunk = list(zip(*row_s.iter_unpack(body[p:end]))) or [() for _ in types]
+        chunk = [list(map(strings.__getitem__, c)) if t == "str" else list(c) for t, c in zip(types, chunk)]
+        p = end
+        for _ in range(n_raw):
+            pos, k = struct.unpack_from("<II", body, p); p += 8
+            ids = struct.unpack_from(f"<{k}I", body, p); p += 4 * k
+            for i, c in enumerate(chunk):
+                c.insert(pos, strings[ids[i]] if i < k else MISSING)
+        for c, part in zip(cols, chunk): c.extend(part)
+    return schema, {c["name"]: col for c, col in zip(schema["columns"], cols)}
+
+
+def read_log(path):
+    """(schema, rows): read_columns as a list of row tuples."""
+    schema, cols = read_columns(path)
+    return schema, list(zip(*cols.values()))
+
+
+def csv_rows(schema, rows):
+    """The rows exactly as the CSV event log writes them."""
+    fmts = [(c["type"], c["format"]) for c in schema["columns"]]
+    for r in rows:
+        yield [v if isinstance(v, str) else _format_float(v, fmt) if kind == "f64" else str(v)
+               for (kind, fmt), v in zip(fmts, r) if v is not MISSING]
+
+
+def to_csv(path, out_path):
+    schema, rows = read_log(path)
+    with open(out_path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow([c["name"] for c in schema["columns"]])
+        w.writerows(csv_rows(schema, rows))
+    return len(rows)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Convert a columnar event log (.evlog) to the CSV format.")
+    ap.add_argument("log")
+    ap.add_argument("-o", "--out", default=None, help="output CSV (default: <log>.converted.csv)")
+    ap.add_argument("--check", metavar="CSV", help="compare the conversion byte for byte with this CSV")
+    args = ap.parse_args()
+    # never the session's own CSV (same base name)
+    out = args.out or os.path.splitext(args.log)[0] + ".converted.csv"
+    t0 = time.perf_counter()
+    n = to_csv(args.log, out)
+    print(f"[EVLOG] {n} rows -> {out} ({(time.perf_counter() - t0) * 1000:.1f} ms)")
+    if args.check:
+        with open(out, "rb") as a, open(args.check, "rb") as b:
+            same = a.read() == b.read()
+        print(f"[EVLOG] {'identical to' if same else 'DIFFERS from'} {args.check}")
+        sys.exit(0 if same else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+# enem_engine
+# Config-driven ENEM fNIRS block experiment. One engine runs every protocol; the
+# experiment file (configs/*.json) picks the trial protocol, data source, block
+# builder, layout and timing:
+#
+#   python -m enem_engine configs/v3.json [--simulate] [--resume] [--profile-startup]
+#   python run_enem_blocks_3.py ...          # launcher for configs/v3.json
+#   python -m enem_engine.preflight configs/v3.json   # layout check / per-item positions
+#   python -m enem_engine.trajectory logs/<log>.traj  # per-trial mouse paths of a session
+
+from .config import CONFIG_VERSION, ConfigError, load_config
+from .engine import Experiment, run
@@ -0,0 +1,9 @@
+# python -m enem_engine <config.json> [engine options]
+import sys
+
+from .engine import run
+
+if len(sys.argv) < 2 or sys.argv[1].startswith("-"):
+    print("usage: python -m enem_engine <config.json> [--simulate] [--resume] [--profile-startup] [--set JSON]")
+    sys.exit(2)
+run(sys.argv[1], sys.argv[2:])
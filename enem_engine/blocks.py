@@ -0,0 +1,68 @@
+# enem_engine/blocks.py
+# Block builders: turn a data source into the session plan, a list of
+# (tag, index, [items]) whose block label is f"{tag}{index}".
+#
+#   planned_by_type  v3: separate concrete and abstract blocks, each filled by the
+#                    block planner to fit duration_secs; one type first, then the other
+#   mixed_types      v2: n_blocks blocks of concrete_per_block + abstract_per_block items
+#   csv_column       v1: the rows of a trials CSV grouped by their block column
+#
+# Every builder draws from the global random state, which the session seeds.
+
+import random, time
+
+
+def planned_by_type(source, bcfg, overhead_secs, log):
+    from block_planner import plan_blocks, describe_block
+    per_type, per_block = bcfg["per_type"], bcfg["questions_per_block"]
+    budget = bcfg["duration_secs"]
+    concrete, abstract = source.index(type="concrete"), source.index(type="abstract")
+    random.shuffle(concrete); random.shuffle(abstract)
+    need = per_type * per_block
+    if len(concrete) < need: print(f"[WARN] Not enough CONCRETE ({len(concrete)}) for {need}. Truncating.")
+    if len(abstract) < need: print(f"[WARN] Not enough ABSTRACT ({len(abstract)}) for {need}. Truncating.")
+    # fit each block's expected time into the block budget and spread fields over blocks
+    t0 = time.perf_counter()
+    c_meta, c_info = plan_blocks(concrete, per_type, per_block, budget, overhead_secs, bcfg["default_item_secs"])
+    a_meta, a_info = plan_blocks(abstract, per_type, per_block, budget, overhead_secs, bcfg["default_item_secs"])
+    plan_secs = time.perf_counter() - t0
+    for tag, metas, info in (("C", c_meta, c_info), ("A", a_meta, a_info)):
+        for i, blk in enumerate(metas):
+            log(f"{tag}{i+1}", describe_block(f"{tag}{i+1}", blk, info["loads"][i], info["fields"][i]))
+    log("PRE", f"score C={c_info['score']:.1f} A={a_info['score']:.1f}; budget {budget}s; "
+               f"planned in {plan_secs*1000:.0f} ms")
+    print(f"[PLAN] score C={c_info['score']:.1f} A={a_info['score']:.1f} ({plan_secs*1000:.0f} ms)")
+    parts = {"C": [source.get_many(blk) for blk in c_meta], "A": [source.get_many(blk) for blk in a_meta]}
+    order = ["C", "A"]; random.shuffle(order)
+    print(f"[PLAN] Block order: first {'concrete' if order[0] == 'C' else 'abstract'} ({per_type} blocks), "
+          f"then the other type ({per_type} blocks).")
+    return [(tag, i + 1, blk) for tag in order for i, blk in enumerate(parts[tag])]
+
+
+def mixed_types(source, bcfg, overhead_secs, log):
+    concrete, abstract = source.index(type="concrete"), source.index(type="abstract")
+    random.shuffle(concrete); random.shuffle(abstract)
+    plan = []
+    for i in range(bcfg["n_blocks"]):
+        metas = [concrete.pop(0) for _ in range(bcfg["concrete_per_block"]) if concrete] + \
+                [abstract.pop(0) for _ in range(bcfg["abstract_per_block"]) if abstract]
+        items = source.get_many(metas)
+        random.shuffle(items)
+        plan.append((bcfg["tag"], i + 1, items))
+    return plan
+
+
+def csv_column(source, bcfg, overhead_secs, log):
+    groups = source.groups(bcfg["column"])
+    order = list(groups)
+    if bcfg["random_order"]:
+        random.shuffle(order)
+    else:
+        try: order.sort(key=float)
+        except ValueError: order.sort()
+    if bcfg["randomize_within"]:
+        for b in order: random.shuffle(groups[b])
+    return [(bcfg["tag"], b, groups[b]) for b in order]
+
+
+BUILDERS = {"planned_by_type": planned_by_type, "mixed_types": mixed_types, "csv_column": csv_column}
@@ -0,0 +1,186 @@
+# enem_engine/config.py
+# Versioned experiment configuration.
+#
+# An experiment is one JSON file (configs/v1.json, v2.json, v3.json) that is deep-merged
+# over DEFAULTS. It selects the trial protocol (the reveal phases), the data source and
+# block builder, the layout and colors, block timing, markers and logging. Relative
+# paths are resolved against the repository directory (the parent of this package).
+# Overrides use dotted keys: {"blocks.questions_per_block": 4}.
+
+import copy, json, os
+
+CONFIG_VERSION = 1
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULTS = {
+    "config_version": CONFIG_VERSION,
+    "name": "",
+    "title": "ENEM fNIRS (Blocks)",
+    "display": {
+        "fullscreen": False, "size": [1920, 1100], "color": [1, 1, 1], "text_color": "black",
+        "box_fill": [-0.2, -0.2, -0.2], "win_type": None, "wait_blanking": False,
+        "stem_text_height": 28, "gen_text_height": 26, "option_text_height": 24,
+        # static screens are drawn once and then only polled for input (no redraw/flip per frame)
+        "static_screens": True, "static_poll_secs": 0.002, "static_redraw_secs": 1.0,
+        "record_frame_timing": False,   # per-phase flip-interval stats in <log>_frames.csv
+        "text_cache_size": 512,         # ready-made text stimuli kept (LRU)
+        "line_cache": True,             # line breaking of the question texts in <data path>.lines.json
+    },
+    "data": {
+        "source": "json",            # "json" (compiled question bank) or "csv" (one row per trial)
+        "path": "questions_with_time.json",
+    },
+    "blocks": {
+        "builder": "planned_by_type",   # planned_by_type | mixed_types | csv_column
+        "per_type": 5, "questions_per_block": 3,                       # planned_by_type
+        "n_blocks": 5, "concrete_per_block": 2, "abstract_per_block": 2,   # mixed_types
+        "column": "block", "random_order": False, "randomize_within": False,   # csv_column
+        "tag": "B",                     # label prefix for mixed_types / csv_column
+        "default_item_secs": 120.0,     # planner: expected time of items without "time"
+        "schedule_file": None,          # precomputed cohort schedules (planned_by_type)
+        "duration_secs": None,          # fixed block length; the rest screen fills the remainder
+        "rest_between_secs": 0,         # rest screen after every block but the last
+        "countdown_secs": 0,
+        "intro_message": "BLOCK {label}\n\nPress SPACE to continue.",
+        "start_marker": "BLK_ON", "end_marker": "BLK_OFF",
+    },
+    "trial": {
+        "iti_min_secs": 3.0, "iti_max_secs": 5.0,
+        "advance_on_release": True,     # reveal on key release (else on press)
+        "debounce_secs": 0.12,          # refractory time after a reveal
+        "feedback_text": "Response recorded", "feedback_correct_text": None, "feedback_secs": 0.5,
+        # reveal protocol: every phase but the last waits for SPACE/button, the last for an answer
+        "phases": [
+            {"name": "q_text_on", "marker": "Q_TEXT_ON", "show": ["text", "button"],
+             "button_label": "Show question"},
+            {"name": "q_stem_on", "marker": "Q_STEM_ON", "show": ["text", "stem", "button"],
+             "button_label": "Show options"},
+            {"name": "q_options_on", "marker": "Q_OPTIONS_ON", "show": ["text", "stem", "options"]},
+        ],
+    },
+    "layout": {
+        # x values: number, "left+N" (screen left edge + N) or "wrap_left+N" (left edge of the wrap width)
+        "wrap_frac": 0.86,
+        "text": {"pos": ["left+60", 320], "anchor": "left", "size": "stem"},
+        "stem": {"pos": ["left+60", 160], "anchor": "left", "size": "gen"},
+        "prompt": {"pos": [0, -0.4], "size": "option", "text": ""},   # y as a fraction of the height if |y| < 1
+        "button": {"pos": [0, -320], "size": [360, 64]},
+        "options": {"y0": 40, "step": -70, "text_x": "left+104", "box_x": "left+78",
+                    "box_size": [46, 46], "anchor": "left", "wrap_frac": 0.86},
+        # per-item positions from python -m enem_engine.preflight (<data path>.layout.json)
+        "preflight": {"use": True, "gap": 12, "margin": 10},
+        # per-item placement at preload; letters shrink in steps of `step` down to min_scale
+        "autofit": {"use": True, "min_scale": 0.7, "step": 0.05},
+    },
+    "input": {
+        "mouse_hz": 500,             # mouse sampling rate (press/release times, trajectories)
+        "thread": "auto",            # sampler thread: true, false or "auto" (pyglet windows only)
+    },
+    "trajectory": {
+        "use": True,                 # record the mouse path of every trial (<log>.traj, trajectory.py)
+        "phases": None,              # trial phase names to record; None = all of them
+        "max_secs": 180,             # ring buffer length per trial; older samples are overwritten
+    },
+    "markers": {
+        "use_fnirs": False,
+        "backends": ["lsl"],
+        "lsl_stream_name": "psychopy_markers", "lsl_stream_type": "Markers", "lsl_queue_size": 256,
+        "parallel_port_addr": 0x0378, "serial_port": "COM3", "serial_baud": 115200,
+        "ttl_pulse_secs": 0.005, "ttl_min_gap_secs": 0.002,
+        "udp_host": "127.0.0.1", "udp_port": 16571,
+        # phase-onset markers (marker send and CSV row) fire on the flip that shows the stimulus
+        "flip_locked": True,
+        "triggers": {
+            "Q_TEXT_ON": 11, "Q_FULL_ON": 12, "BUTTON_CLICK": 13, "Q_STEM_ON": 14, "Q_OPTIONS_ON": 15,
+            "ANS_A": 21, "ANS_B": 22, "ANS_C": 23, "ANS_D": 24, "ANS_E": 25,
+            "BLK_ON": 91, "BLK_OFF": 92, "ITI": 99, "BLOCK_REST": 93,
+            "QUESTIONNAIRE_ON": 71, "QUESTIONNAIRE_OFF": 72, "SESSION_RESUME": 95,
+        },
+        "session_markers": None,   # e.g. ["BLK_ON", "BLK_OFF"] around the whole session (v1)
+    },
+    "log": {
+        "dir": "logs",
+        "schema": "v2",            # "v1": question_id columns; "v2": question metadata + view times
+        "columnar": True,          # also write <log>.evlog (columnar_log.py; converts back to the CSV)
+    },
+    "questionnaire": {
+        "before": True, "after_block": None, "choice_columns": 1, "choice_hint": None,
+        "intro": "QUESTIONNAIRE\n\nAnswer the following questions.\nPress SPACE to continue.",
+        "items": [
+            {"qid": "age", "text": "What is your age?", "type": "text", "required": "yes"},
+            {"qid": "gender", "text": "What is your gender?", "type": "choice", "options": "Woman,Man", "required": "yes"},
+            {"qid": "country_birth", "text": "Country of birth:", "type": "text", "required": "no"},
+            {"qid": "home_language", "text": "Which language do you most often speak at home?", "type": "text", "required": "yes"},
+        ],
+    },
+    "messages": {
+        "welcome": "Welcome!\n\nPress SPACE to begin.",
+        "goodbye": "Thank you for participating!\n\nPress SPACE to finish.",
+    },
+}
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def _merge(base, over):
+    out = copy.deepcopy(base)
+    for k, v in over.items():
+        if isinstance(v, dict) and isinstance(out.get(k), dict): out[k] = _merge(out[k], v)
+        else: out[k] = copy.deepcopy(v)
+    return out
+
+
+def apply_overrides(cfg, overrides):
+    """Set dotted keys, e.g. {"blocks.duration_secs": 360}."""
+    for dotted, value in (overrides or {}).items():
+        node = cfg
+        *path, leaf = dotted.split(".")
+        for part in path:
+            if not isinstance(node.get(part), dict): raise ConfigError(f"unknown config section in {dotted!r}")
+            node = node[part]
+        node[leaf] = value
+    return cfg
+
+
+def resolve_path(path):
+    if path is None or os.path.isabs(path): return path
+    return os.path.join(BASE_DIR, path)
+
+
+def item_overhead_secs(cfg):
+    """Per-trial time on top of an item's "time": mean ITI + feedback screen."""
+    tcfg = cfg["trial"]
+    return (tcfg["iti_min_secs"] + tcfg["iti_max_secs"]) / 2 + tcfg["feedback_secs"]
+
+
+def load_config(path, overrides=None):
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    version = raw.get("config_version")
+    if version != CONFIG_VERSION:
+        raise ConfigError(f"{path}: config_version {version!r} is not supported (expected {CONFIG_VERSION})")
+    cfg = apply_overrides(_merge(DEFAULTS, raw), overrides)
+    cfg["source_path"] = os.path.abspath(path)
+    validate(cfg)
+    return cfg
+
+
+def validate(cfg):
+    if cfg["data"]["source"] not in ("json", "csv"):
+        raise ConfigError(f"data.source must be 'json' or 'csv', not {cfg['data']['source']!r}")
+    if cfg["blocks"]["builder"] not in ("planned_by_type", "mixed_types", "csv_column"):
+        raise ConfigError(f"unknown blocks.builder {cfg['blocks']['builder']!r}")
+    if (cfg["data"]["source"] == "csv") != (cfg["blocks"]["builder"] == "csv_column"):
+        raise ConfigError("blocks.builder 'csv_column' goes with data.source 'csv' (and only with it)")
+    if cfg["blocks"]["builder"] == "planned_by_type" and not cfg["blocks"]["duration_secs"]:
+        raise ConfigError("blocks.builder 'planned_by_type' fits blocks to blocks.duration_secs; set it (seconds)")
+    if cfg["log"]["schema"] not in ("v1", "v2"):
+        raise ConfigError(f"log.schema must be 'v1' or 'v2', not {cfg['log']['schema']!r}")
+    phases = cfg["trial"]["phases"]
+    if not phases or "options" not in phases[-1]["show"]:
+        raise ConfigError("the last trial phase must show the options")
+    unknown = set(cfg["trajectory"]["phases"] or ()) - {p["name"] for p in phases}
+    if unknown:
+        raise ConfigError(f"trajectory.phases names phases the trial does not have: {sorted(unknown)}")
@@ -0,0 +1,811 @@
+# enem_engine/engine.py
+# The experiment engine: one Experiment per session, built from a config (config.py).
+#
+# Start-up order: prefs/imports -> participant dialog -> background preparation
+# (markers, data store, schedule lookup) overlapping window creation -> log ->
+# plan (checkpoint, precomputed schedule or the configured block builder) -> welcome
+# and questionnaire screens, during which the trial stimuli are built -> blocks.
+#
+# A trial is the configured reveal protocol: every phase but the last adds screen
+# slots and waits for SPACE or the button, the last shows the options and waits for
+# an answer. Phase-onset markers and rows are flip-locked; unchanged screens are only
+# polled, not redrawn.
+# The mouse path of each trial goes to <log>.traj (trajectory.py) during the next ITI;
+# the trial's option dwell times and hover switches are logged as a "trajectory" row.
+#
+#   --simulate [--sim-id P01] [--sim-seed N] [--sim-script rt.json] [--sim-log-dir DIR]
+#              [--sim-config '{"blocks.questions_per_block": 4}']   headless (sim_psychopy)
+#   --resume            continue the participant's last session from its checkpoint
+#   --profile-startup   print how long each start-up stage took
+#   --set '{"dotted.key": value}'   config overrides for a real run
+
+import argparse, json, os, random, sys, threading, time, tracemalloc
+
+from .config import BASE_DIR, item_overhead_secs, load_config, resolve_path
+from .sources import open_source
+from .blocks import BUILDERS
+from .stimuli import Layout, LETTERS
+from .textcache import LineCache
+from .inputs import InputSampler
+from .questionnaire import run_questionnaire
+
+from event_log import EventLog
+from columnar_log import ColumnarLog
+from checkpoint import Checkpointer, load_checkpoint, rng_state, set_rng_state
+from markers import open_markers
+
+LOG_HEADERS = {
+    "v1": ["t_abs", "phase", "block", "trial_idx_in_block", "question_id", "marker_name", "marker_code",
+           "rt_from_phase", "choice", "correct", "note"],
+    "v2": ["t_abs", "phase", "block", "trial_idx_in_block", "question_number", "question_year",
+           "question_type", "question_field", "marker_name", "marker_code",
+           "rt_from_phase", "choice", "correct", "button_click_time", "option_view_time", "note"],
+}
+
+
+def parse_args(argv):
+    ap = argparse.ArgumentParser(description="ENEM fNIRS block experiment.")
+    ap.add_argument("--config", default=None, help="experiment config JSON (overrides the launcher's)")
+    ap.add_argument("--set", default=None, help="JSON object of dotted config overrides")
+    ap.add_argument("--resume", action="store_true")
+    ap.add_argument("--profile-startup", action="store_true")
+    ap.add_argument("--simulate", action="store_true")
+    ap.add_argument("--sim-id", default="sim")
+    ap.add_argument("--sim-seed", type=int, default=None)
+    ap.add_argument("--sim-script", default=None)
+    ap.add_argument("--sim-log-dir", default=None)
+    ap.add_argument("--sim-config", default=None)
+    return ap.parse_args(argv)
+
+
+class Experiment:
+    def __init__(self, cfg, args, t0=None):
+        self.cfg, self.args = cfg, args
+        self.t0 = t0 if t0 is not None else time.perf_counter()
+        self.startup_stages = []   # (stage, seconds)
+        self._stage_t = self.t0
+        self.triggers = cfg["markers"]["triggers"]
+        self.schema = cfg["log"]["schema"]
+        self.flip_locked = cfg["markers"]["flip_locked"]
+        self.static = cfg["display"]["static_screens"]
+        self.prep = {"times": []}
+        self.flip_sched = {"armed": False, "t": None, "rows": []}
+        self.last_draw = 0.0
+        self.trial_stims = {}        # source key -> per-question stimuli
+        self.background_tasks = []   # generators stepped once per frame on idle screens
+        self.logs = []               # the CSV event log, plus the columnar copy (log.columnar)
+        self.markers = self.event_log = self.checkpointer = self.frame_timer = self.win = None
+        self.button = self.button_lbl = self.prompt_text = self.layout = self.inputs = self.traj = None
+        self.sample_on_idle = False
+        self.idled = False           # idle_poll() ran since the last flip
+        self.session_state = None
+
+    # ===== start-up =====
+    def startup_stage(self, name):
+        now = time.perf_counter()
+        self.startup_stages.append((name, now - self._stage_t)); self._stage_t = now
+
+    def _import_psychopy(self):
+        # prefs BEFORE anything that creates windows; visual/event/keyboard (GL + window
+        # backend) are imported after the dialog, see open_window
+        if self.args.simulate:
+            import sim_psychopy as pp
+            prefs, self.core, self.gui, logging = pp.prefs, pp.core, pp.gui, pp.logging
+        else:
+            from psychopy import prefs
+            from psychopy import core, gui, logging
+            self.core, self.gui = core, gui
+        prefs.general['measureFrameRate'] = False
+        prefs.general['shutdownKey'] = 'escape'
+        prefs.general['autoLog'] = False
+        if self.cfg["display"]["win_type"]: prefs.general['winType'] = self.cfg["display"]["win_type"]
+        logging.console.setLevel(logging.ERROR)
+
+    def _paths(self):
+        args = self.args
+        if args.simulate:
+            self.log_dir = args.sim_log_dir or os.path.join(BASE_DIR, "logs", "sim")
+        else:
+            self.log_dir = resolve_path(self.cfg["log"]["dir"])
+        os.makedirs(self.log_dir, exist_ok=True)
+        data_path = resolve_path(self.cfg["data"]["path"])
+        if args.simulate and not os.path.exists(data_path):
+            # lab paths are absolute; the simulator falls back to the copy in the repo
+            data_path = os.path.join(BASE_DIR, os.path.basename(data_path.replace("\\", "/")))
+        self.source = open_source(self.cfg["data"], data_path)
+        self.schedule_file = resolve_path(self.cfg["blocks"]["schedule_file"])
+
+    def _dialog(self):
+        # before any window/GL work; a cancel costs nothing
+        if self.args.simulate: self.gui.participant_id = self.args.sim_id
+        self.exp_info = {"participant": "", "session": "001"}
+        dlg = self.gui.DlgFromDict(self.exp_info, title=self.cfg["title"])
+        if not dlg.OK: self.core.quit()
+
+    def _prep_startup(self):
+        # Marker backends, the data store and the schedule lookup need no window.
+        # The window itself stays on the main thread (GL contexts/event loops are thread-bound).
+        prep, m = self.prep, self.cfg["markers"]
+        def timed(name, fn, *args, **kwargs):
+            t0 = time.perf_counter(); out = fn(*args, **kwargs)
+            prep["times"].append((name, time.perf_counter() - t0)); return out
+        prep["markers"] = timed("markers", open_markers,
+            m["backends"] if m["use_fnirs"] else [], clock=self.core.getTime,
+            lsl_name=m["lsl_stream_name"], lsl_type=m["lsl_stream_type"], lsl_queue=m["lsl_queue_size"],
+            parallel_addr=m["parallel_port_addr"], serial_port=m["serial_port"], serial_baud=m["serial_baud"],
+            ttl_width=m["ttl_pulse_secs"], ttl_min_gap=m["ttl_min_gap_secs"],
+            udp_host=m["udp_host"], udp_port=m["udp_port"],
+            file_path=os.path.join(self.log_dir, f"markers_{time.strftime('%Y%m%d_%H%M%S')}.csv"))
+        try:
+            if self.source.exists():
+                timed("data", self.source.prepare)
+                prep["prepared"] = True
+            if not self.args.resume and self.schedule_file:
+                from cohort_schedules import lookup_schedule, plan_settings
+                prep["schedule"] = timed("schedule", lookup_schedule, self.schedule_file,
+                                         self.exp_info["participant"], self.source.path, plan_settings(self.cfg))
+        except Exception as e:
+            print("[STARTUP] background preparation failed, retrying on the main thread:", e)
+            prep.pop("prepared", None); prep.pop("schedule", None)
+
+    def open_window(self):
+        if self.args.simulate:
+            from sim_psychopy import visual, event, keyboard
+        else:
+            from psychopy import visual, event
+            from psychopy.hardware import keyboard
+        self.visual, self.event = visual, event
+        self.startup_stage("import_visual")
+        self.clock = self.core.MonotonicClock()
+        disp = self.cfg["display"]
+        print("Initializing window...")
+        try:
+            self.win = visual.Window(size=disp["size"], fullscr=disp["fullscreen"], color=disp["color"], units="pix",
+                                     waitBlanking=disp["wait_blanking"], autoLog=False)
+            self.win.recordFrameIntervals = False
+            print("Window created successfully!")
+        except Exception as e:
+            print(f"ERROR creating window: {e}")
+            print("Trying alternative window creation...")
+            try:
+                self.win = visual.Window(size=disp["size"], fullscr=False, color=[-1, -1, -1], units="pix")
+                print("Window created with fallback method!")
+            except Exception as e2:
+                print(f"FATAL ERROR: Could not create window: {e2}")
+                sys.exit(1)
+        self.kb = keyboard.Keyboard()
+        self.mouse = event.Mouse(win=self.win)
+        icfg = self.cfg["input"]
+        thread = icfg["thread"] if icfg["thread"] != "auto" else \
+            not self.args.simulate and (disp["win_type"] or "pyglet") == "pyglet"
+        self.inputs = InputSampler(self.clock, self.mouse, self.kb, icfg["mouse_hz"], thread)
+        # without the thread, idle polls sample the mouse (the simulator's never moves)
+        self.sample_on_idle = not thread and not self.args.simulate
+        if self.args.simulate:
+            from sim_psychopy import install_participant
+            install_participant(self.win, self.kb, self.args.sim_seed, self.args.sim_script)
+        if disp["record_frame_timing"]:
+            from frame_timing import FrameTimer
+            self.frame_timer = FrameTimer(self.win.monitorFramePeriod)
+
+        # only the fixed stimuli the protocol's phases show
+        self.layout = Layout(self.win, visual, self.cfg)
+        if disp["line_cache"]:
+            # simulated sessions (estimates only) keep theirs with their logs, not with the data file
+            base = os.path.join(self.log_dir, os.path.basename(self.source.path)) if self.args.simulate \
+                else self.source.path
+            self.layout.lines = LineCache(base + ".lines.json")
+        from .preflight import layout_path, load_placements   # not at import: python -m enem_engine.preflight
+        if self.cfg["layout"]["preflight"]["use"] and os.path.exists(layout_path(self.source.path)):
+            self.layout.placements = load_placements(layout_path(self.source.path), self.cfg, self.win.size)
+            if self.layout.placements: print(f"[LAYOUT] pre-flight positions for {len(self.layout.placements)} items")
+        self.msg_text = self.layout.message()
+        if "button" in self.layout.slots: self.button, self.button_lbl = self.layout.button()
+        if "prompt" in self.layout.slots: self.prompt_text = self.layout.prompt()
+        self.opt_boxes = self.layout.option_boxes()
+
+    def set_frame_phase(self, phase):
+        if self.frame_timer is not None: self.frame_timer.set_phase(phase)
+
+    # ===== markers I/O =====
+    def _dispatch_marker(self, code_name, code_int):
+        t = self.clock.getTime()
+        self.markers.send(code_name, code_int)
+        return t
+
+    def send_marker(self, code_name, on_flip=False):
+        """Send now, or (on_flip=True with flip-locked markers) right after the next
+        win.flip() swaps the buffers; scheduled markers return t=None. Names missing
+        from the trigger map are only logged, never sent."""
+        code_int = self.triggers.get(code_name, 0)
+        if code_name not in self.triggers: return code_name, code_int, self.clock.getTime()
+        if on_flip and self.flip_locked:
+            self._arm_flip()
+            self.win.callOnFlip(self._dispatch_marker, code_name, code_int)
+            return code_name, code_int, None
+        return code_name, code_int, self._dispatch_marker(code_name, code_int)
+
+    # ===== flip-locked scheduling =====
+    def _stamp_flip(self):
+        self.flip_sched["t"] = self.clock.getTime()
+
+    def _arm_flip(self):
+        # the stamp goes in first so it is not delayed by marker sends queued after it
+        if not self.flip_sched["armed"]:
+            self.win.callOnFlip(self._stamp_flip); self.flip_sched["armed"] = True
+
+    def flip(self):
+        """win.flip() that resolves everything scheduled with on_flip=True.
+        Returns the flip time on the experiment clock."""
+        t_win = self.win.flip()
+        if self.frame_timer is not None: self.frame_timer.tick()
+        sched = self.flip_sched
+        if not sched["armed"]:
+            return self.clock.getTime()
+        t_flip = sched["t"]
+        t_swap = t_win - self.clock.getLastResetTime()   # win.flip() stamps on core.getTime()
+        for args, kwargs in sched["rows"]:
+            phase, block_label, trial_idx, q_data, marker_name, code, t_phase_start = args
+            if t_phase_start is None: t_phase_start = t_flip
+            note = kwargs.pop("note")
+            kwargs["note"] = f"flip_t={t_swap:.6f}" + (f"; {note}" if note else "")
+            self.log_event(phase, block_label, trial_idx, q_data, marker_name, code, t_phase_start,
+                           t_abs=t_flip, **kwargs)
+        sched.update(armed=False, t=None, rows=[])
+        return t_flip
+
+    # ===== logging =====
+    def open_log(self):
+        self.timestamp = time.strftime("%Y%m%d_%H%M%S")
+        self.log_path = os.path.join(self.log_dir, f"enem_blocks_{self.exp_info['participant']}_{self.timestamp}.csv")
+        try:
+            self.event_log = EventLog(self.log_path, LOG_HEADERS[self.schema])
+        except Exception as e:
+            print(f"[LOG] Could not open log file: {e}")
+            try:
+                self.msg_text.text = "Error: cannot open log file. Check write permissions."
+                self.msg_text.draw(); self.win.flip(); self.core.wait(2.0)
+            except Exception: pass
+            sys.exit(1)
+        self.logs = [self.event_log]
+        if self.cfg["log"]["columnar"]:
+            try:
+                self.logs.append(ColumnarLog(self.log_path[:-4] + ".evlog", LOG_HEADERS[self.schema]))
+            except Exception as e:
+                print(f"[LOG] Could not open the columnar log (CSV only): {e}")
+        tr = self.cfg["trajectory"]
+        if tr["use"]:
+            from .trajectory import TrajectoryRecorder   # NumPy only when recording
+            try:
+                self.traj = TrajectoryRecorder(self.log_path[:-4] + ".traj",
+                                               tr["max_secs"] * self.cfg["input"]["mouse_hz"], tr["phases"])
+                self.traj.attach(self.inputs)
+            except Exception as e:
+                print(f"[LOG] Could not open the trajectory file: {e}")
+        print(f"[LOG] Writing to: {os.path.abspath(self.log_path)}")
+        self.ckpt_path = os.path.join(
+            self.log_dir, f"enem_blocks_{self.exp_info['participant']}_{self.exp_info['session']}.checkpoint.json")
+
+    def log_event(self, phase, block_label, trial_idx, q_data, marker_name, code, t_phase_start,
+                  choice="", correct="", button_click_t="", opt_view_t="", note="",
+                  on_flip=False, t_abs=None):
+        # on_flip=True (with flip-locked markers): the row is written after the next flip(),
+        # stamped with the flip time; t_phase_start=None then means "this flip".
+        if on_flip and self.flip_locked:
+            self._arm_flip()
+            self.flip_sched["rows"].append(((phase, block_label, trial_idx, q_data, marker_name, code, t_phase_start),
+                                            dict(choice=choice, correct=correct, button_click_t=button_click_t,
+                                                 opt_view_t=opt_view_t, note=note)))
+            return
+        if t_abs is None: t_abs = self.clock.getTime()
+        rt = (t_abs - t_phase_start) if t_phase_start is not None else ""
+        q = self.source.log_fields(q_data) if q_data else {"id": "", "number": "", "year": "", "type": "", "field": ""}
+        if self.schema == "v1":
+            row = [f"{t_abs:.6f}", phase, block_label, trial_idx, q["id"], marker_name, code, f"{rt}",
+                   choice, correct, note]
+        else:
+            row = [f"{t_abs:.6f}", phase, block_label, trial_idx, q["number"], q["year"], q["type"], q["field"],
+                   marker_name, code, f"{rt}", choice, correct, button_click_t, opt_view_t, note]
+        for log in self.logs: log.writerow(row)
+
+    def sync_logs(self):
+        for log in self.logs: log.sync()
+
+    def log_startup(self):
+        total = time.perf_counter() - self.t0
+        main = " ".join(f"{name}={1000*secs:.0f}ms" for name, secs in self.startup_stages)
+        bg = " ".join(f"{name}={1000*secs:.0f}ms" for name, secs in self.prep["times"])
+        self.log_event("startup", "PRE", -1, {}, "STARTUP", 0, None,
+                       note=f"config={self.cfg['name']}; total={1000*total:.0f}ms; {main}; background: {bg or 'none'}")
+        if self.args.profile_startup:
+            print(f"[STARTUP] total {1000*total:.0f} ms")
+            for name, secs in self.startup_stages: print(f"[STARTUP]   {name:<16} {1000*secs:8.1f} ms")
+            for name, secs in self.prep["times"]: print(f"[STARTUP]   (bg) {name:<11} {1000*secs:8.1f} ms")
+
+    def log_marker_stats(self, block_label):
+        # per backend: one row per dropped/failed marker, then the call-cost/latency summary
+        for b in self.markers.backends:
+            for name, ts, reason in b.take_errors():
+                self.log_event(f"{b.name}_error", block_label, -1, {}, name, self.triggers.get(name, 0), None,
+                               note=f"marker_t={ts:.6f}; {reason}")
+            self.log_event(f"{b.name}_stats", block_label, -1, {}, f"{b.name.upper()}_STATS", 0, None,
+                           note=b.summary())
+
+    def quit(self):
+        if self.inputs is not None: self.inputs.close()
+        if self.markers:
+            self.markers.close()
+            try:
+                if not self.event_log.closed: self.log_marker_stats("END")
+            except Exception: pass
+            self.markers.write_latencies(self.log_path[:-4])
+        if self.frame_timer is not None:
+            try:
+                frames_path = self.log_path[:-4] + "_frames.csv"
+                self.frame_timer.write_summary(frames_path); print(f"[TIMING] Frame summary: {frames_path}")
+            except Exception as e: print("[TIMING] could not write frame summary:", e)
+        if self.checkpointer is not None: self.checkpointer.close()
+        if self.traj is not None:
+            try:
+                trial = self.traj.meta   # a trial still on screen (escape): kept, marked aborted
+                note = self.traj.close(self.clock.getTime())
+                if not self.event_log.closed:
+                    if note:
+                        self.log_event("trajectory", trial["block"], trial["trial"], {}, "TRAJECTORY", 0, None,
+                                       note="aborted; " + note)
+                    self.log_event("trajectory_stats", "END", -1, {}, "TRAJECTORY_STATS", 0, None, note=self.traj.summary())
+            except Exception: pass
+        if self.layout is not None:
+            if self.layout.lines is not None: self.layout.lines.save()
+            try:
+                if not self.event_log.closed:
+                    lines = f" | lines {self.layout.lines.summary()}" if self.layout.lines is not None else ""
+                    self.log_event("text_cache", "END", -1, {}, "TEXT_CACHE", 0, None,
+                                   note=self.layout.cache.summary() + lines)
+            except Exception: pass
+        if self.inputs is not None:
+            try:
+                if not self.event_log.closed:
+                    secs = max(1e-9, self.clock.getTime())
+                    self.log_event("input_stats", "END", -1, {}, "INPUT_STATS", 0, None,
+                                   note=f"mouse samples={self.inputs.samples} ({self.inputs.samples / secs:.0f}/s); "
+                                        f"thread={self.inputs.threaded}")
+            except Exception: pass
+        for log in self.logs:
+            try: log.close()
+            except Exception: pass
+        self.source.close()
+        try: self.win.close()
+        except Exception: pass
+        if self.args.simulate:
+            print(f"[SIM] {self.clock.getTime():.0f}s session simulated in {time.perf_counter() - self.t0:.1f}s")
+        self.core.quit()
+
+    # ===== screen helpers =====
+    def idle_poll(self):
+        # keep window/mouse events flowing without drawing
+        try: self.win.backend.dispatchEvents()
+        except Exception: pass
+        if self.sample_on_idle: self.inputs.poll()
+        self.idled = True
+        self.core.wait(self.cfg["display"]["static_poll_secs"])
+
+    def present(self, drawlist, redraw=True):
+        """Draw drawlist and flip; returns the flip time (see flip()).
+        With static screens, redraw=False leaves the last frame on screen and only polls
+        input (returns None), apart from a safety redraw every static_redraw_secs."""
+        if self.static and not redraw and \
+                time.perf_counter() - self.last_draw < self.cfg["display"]["static_redraw_secs"]:
+            self.idle_poll(); return None
+        for stim in drawlist: stim.draw()
+        # a redraw after idle polling is not a frame interval (frame timing report)
+        if self.idled and self.frame_timer is not None: self.frame_timer.gap()
+        self.idled = False
+        t = self.flip(); self.last_draw = time.perf_counter()
+        self.core.wait(0.001)
+        return t
+
+    def wait_secs_draw(self, secs, drawlist=None):
+        if secs <= 0: return
+        t0 = self.core.Clock(); redraw = True
+        while t0.getTime() < secs:
+            self.present(drawlist or [], redraw); redraw = False
+
+    def show_message(self, text, key_to_continue="space"):
+        self.set_frame_phase("message")
+        self.msg_text.text = text
+        self.kb.clearEvents()
+        redraw = True
+        while True:
+            self.step_background()
+            self.present([self.msg_text], redraw); redraw = False
+            keys = self.kb.getKeys([key_to_continue, 'escape'], waitRelease=False)
+            if keys:
+                if keys[0].name == 'escape': self.quit()
+                break
+
+    def countdown(self, label, secs):
+        for t in range(int(secs), 0, -1):
+            self.msg_text.text = f"Block {label} starting in {t}..."
+            self.wait_secs_draw(1.0, [self.msg_text])
+
+    def wait_for_mouse_release(self):
+        # Debounce: wait until all mouse buttons are released (no flips; returns the release time)
+        return self.inputs.wait_release(idle=self.idle_poll)
+
+    def reset_input(self):
+        self.event.clearEvents(); self.kb.clearEvents(); self.mouse.clickReset()
+        self.wait_for_mouse_release(); self.inputs.clear()
+
+    def debounce_after_trigger(self):
+        # Short refractory period after a reveal to avoid double-advance with held keys
+        secs = self.cfg["trial"]["debounce_secs"]
+        if secs <= 0: return
+        self.reset_input()
+        self.core.wait(secs)
+
+    # ===== stimulus preload =====
+    def make_trial_stims(self, q):
+        fields, item_id = self.source.fields(q), self.source.log_fields(q)["id"]
+        if item_id not in self.layout.placements and self.cfg["layout"]["autofit"]["use"]:
+            self.layout.placements[item_id] = self.layout.fit(fields)
+        stims = self.layout.trial_stims(fields, item_id)
+        # first draw does the layout + glyph upload; do it now, not on the reveal frame
+        for slot in ("text", "stem"):
+            if slot in stims: stims[slot].draw()
+        for stim in stims["options"]: stim.draw()
+        if self.layout.lines is not None:
+            for slot in ("text", "stem"):
+                if slot in stims: self.layout.lines.record(stims[slot])
+        return stims
+
+    def _stim_key(self, q):
+        key = self.source.key(q)
+        return tuple(key) if isinstance(key, list) else key
+
+    def preload_trial_stims(self, plan):
+        """Generator: builds and warms one question per step, then logs time/memory used."""
+        t0 = time.perf_counter()
+        tracing = not tracemalloc.is_tracing()
+        if tracing: tracemalloc.start()
+        mem0 = tracemalloc.get_traced_memory()[0]
+        n = 0
+        for _, _, questions in plan:
+            for q in questions:
+                key = self._stim_key(q)
+                if key not in self.trial_stims:
+                    self.trial_stims[key] = self.make_trial_stims(q); n += 1
+                    yield
+        mem_kb = (tracemalloc.get_traced_memory()[0] - mem0) / 1024.0
+        if tracing: tracemalloc.stop()
+        secs = time.perf_counter() - t0
+        print(f"[PRELOAD] {n} questions in {secs:.2f}s, ~{mem_kb:.0f} KB (Python heap)")
+        self.log_event("preload", "PRE", -1, {}, "PRELOAD", 0, None,
+                       note=f"{n} questions; {secs:.3f}s wall; {mem_kb:.0f} KB python heap; "
+                            f"text cache {self.layout.cache.summary()}; layout fit "
+                            + " ".join(f"{k}={v}" for k, v in self.layout.fit_stats.items()))
+        if self.layout.lines is not None: self.layout.lines.save()
+
+    def step_background(self):
+        # Advance the first pending background task by one step (one question).
+        # Warm-up draws land in the back buffer, so clear it before the real frame.
+        while self.background_tasks:
+            try:
+                next(self.background_tasks[0])
+            except StopIteration:
+                self.background_tasks.pop(0); continue
+            self.win.clearBuffer()
+            return
+
+    def finish_background(self):
+        while self.background_tasks:
+            for _ in self.background_tasks.pop(0): pass
+        self.win.clearBuffer()
+
+    def get_trial_stims(self, q):
+        key = self._stim_key(q)
+        if key not in self.trial_stims:
+            self.trial_stims[key] = self.make_trial_stims(q); self.win.clearBuffer()
+        return self.trial_stims[key]
+
+    # ===== trial =====
+    def _screen(self, show, stims):
+        out = []
+        for slot in show:
+            if slot in ("text", "stem"): out.append(stims[slot])
+            elif slot == "prompt": out.append(self.prompt_text)
+            elif slot == "button": out += [self.button, self.button_lbl]
+            elif slot == "options":
+                out += [s for pair in zip(stims.get("boxes", self.opt_boxes), stims["options"]) for s in pair]
+        return out
+
+    def _wait_reveal(self, screen, min_view):
+        """Waits for the (debounced) button click or SPACE; returns the time of the
+        press as stamped by the input layer (not the frame that noticed it)."""
+        on_release = self.cfg["trial"]["advance_on_release"]
+        onset = self.present(screen)
+        while True:
+            self.present(screen, redraw=False)
+            if min_view and self.clock.getTime() - onset < min_view:
+                self.inputs.clear(); continue
+            # mouse (press-and-release)
+            if self.button is not None:
+                _, press = self.inputs.click_in([self.button])
+                if press is not None:
+                    self.wait_for_mouse_release(); t_click = press.t
+                    break
+            keys = self.inputs.keys(['space', 'escape'], wait_release=on_release)
+            if keys:
+                if keys[0].name == 'escape': self.quit()
+                t_click = keys[0].t
+                break
+        self.send_marker("BUTTON_CLICK")
+        self.debounce_after_trigger()
+        return t_click
+
+    def run_trial(self, block_label, idx_in_block, q):
+        tcfg = self.cfg["trial"]
+        phases = tcfg["phases"]
+        # ITI
+        iti_duration = random.uniform(tcfg["iti_min_secs"], tcfg["iti_max_secs"])
+        iti_start = self.clock.getTime()
+        self.msg_text.text = "+"
+        self.set_frame_phase("iti")
+        if self.traj is not None: self.traj.flush()   # previous trial's samples, during the fixation
+        self.wait_secs_draw(iti_duration, [self.msg_text])
+        self.send_marker("ITI")
+        self.log_event("iti", block_label, idx_in_block, q, "ITI", self.triggers.get("ITI", 0), iti_start,
+                       note=f"ITI duration: {iti_duration:.2f}s")
+
+        # content (preloaded; reveals only swap in ready-made stimuli)
+        stims = self.get_trial_stims(q)
+        boxes = stims.get("boxes", self.opt_boxes)
+        if self.traj is not None:
+            self.traj.begin(block_label, idx_in_block, self.source.log_fields(q), [p["name"] for p in phases], boxes,
+                            [i for i, p in enumerate(phases) if "options" in p["show"]])
+        self.reset_input()
+        t_click = ""
+        for i, phase in enumerate(phases[:-1]):
+            if "button" in phase["show"]: self.button_lbl.text = phase.get("button_label", "")
+            self.send_marker(phase["marker"], on_flip=True)
+            self.log_event(phase["name"], block_label, idx_in_block, q, phase["marker"],
+                           self.triggers.get(phase["marker"], 0), None, button_click_t=t_click, on_flip=True)
+            self.set_frame_phase(phase["name"])
+            if self.traj is not None: self.traj.phase(i, self.clock.getTime())
+            t_click = f"{self._wait_reveal(self._screen(phase['show'], stims), phase.get('min_view_secs', 0)):.6f}"
+
+        # answer phase: options on screen
+        last = phases[-1]
+        chosen = None
+        self.reset_input()
+        self.send_marker(last["marker"], on_flip=True)
+        self.log_event(last["name"], block_label, idx_in_block, q, last["marker"],
+                       self.triggers.get(last["marker"], 0), None, button_click_t=t_click, on_flip=True)
+        self.set_frame_phase(last["name"])
+        if self.traj is not None: self.traj.phase(len(phases) - 1, self.clock.getTime())
+        answer_screen = self._screen(last["show"], stims)
+        options_on = self.present(answer_screen)
+        while chosen is None:
+            self.present(answer_screen, redraw=False)
+            i, press = self.inputs.click_in(boxes)
+            if press is not None:
+                self.wait_for_mouse_release()
+                chosen, answer_time = LETTERS[i], press.t; break
+            keys = self.inputs.keys(['a', 'b', 'c', 'd', 'e', '1', '2', '3', '4', '5', 'escape'], wait_release=True)
+            if keys:
+                name, answer_time = keys[0].name, keys[0].t
+                if name == 'escape': self.quit()
+                elif name in ('a', 'b', 'c', 'd', 'e'): chosen = name.upper()
+                elif name in ('1', '2', '3', '4', '5'): chosen = LETTERS[int(name) - 1]
+
+        ans_marker = f"ANS_{chosen}"
+        self.send_marker(ans_marker)
+        key = self.source.fields(q)["correct"]
+        is_correct = (chosen == key) if key in tuple(LETTERS) else ""
+        self.log_event("answer", block_label, idx_in_block, q, ans_marker, self.triggers.get(ans_marker, 0),
+                       options_on, choice=chosen, correct=is_correct, opt_view_t=f"{answer_time - options_on:.6f}",
+                       t_abs=answer_time)
+        if self.traj is not None:
+            self.log_event("trajectory", block_label, idx_in_block, q, "TRAJECTORY", 0, options_on,
+                           choice=chosen, note=self.traj.end(answer_time), t_abs=answer_time)
+        self.msg_text.text = tcfg["feedback_correct_text"] if is_correct is True and tcfg["feedback_correct_text"] \
+            else tcfg["feedback_text"]
+        self.set_frame_phase("answer")
+        self.wait_secs_draw(tcfg["feedback_secs"], [self.msg_text])
+        self.set_frame_phase(None)
+
+    # ===== block runner =====
+    def save_checkpoint(self):
+        self.session_state["rng"] = rng_state()
+        self.checkpointer.save(self.session_state)
+
+    def run_block(self, block_label, questions):
+        bcfg, state = self.cfg["blocks"], self.session_state
+        # a resumed block skips its completed trials and only gets the rest of its time budget
+        done = state["trials_done"].setdefault(block_label, [])
+        elapsed_before = state["block_elapsed"].get(block_label, 0.0)
+        duration = bcfg["duration_secs"]
+        budget = duration - elapsed_before if duration else None
+        mname, mcode, _ = self.send_marker(bcfg["start_marker"])
+        self.log_event("block_start", block_label, -1, {}, mname, mcode, None,
+                       note=f"{block_label} start" + (f" (target {duration}s)" if duration else "") +
+                            (f"; resumed after trials {done}, {elapsed_before:.1f}s used" if done else ""))
+        self.sync_logs()
+        block_clock = self.core.Clock(); block_clock.reset()
+
+        for trial_idx, q in enumerate(questions, start=1):
+            if trial_idx in done: continue
+            self.run_trial(block_label, trial_idx, q)
+            done.append(trial_idx)
+            state["block_elapsed"][block_label] = elapsed_before + block_clock.getTime()
+            self.save_checkpoint()
+            if budget is not None and block_clock.getTime() >= budget:
+                break
+
+        remaining = budget - block_clock.getTime() if budget is not None else 0
+        if remaining > 0:
+            self.send_marker("BLOCK_REST", on_flip=True)
+            self.log_event("block_rest_wait", block_label, -1, {}, "BLOCK_REST", self.triggers.get("BLOCK_REST", 0),
+                           None, note=f"Waiting {remaining:.1f}s to complete {duration:.0f}s block", on_flip=True)
+            self.rest_screen(remaining, "block_rest_wait")
+
+        mname, mcode, _ = self.send_marker(bcfg["end_marker"])
+        self.log_event("block_end", block_label, -1, {}, mname, mcode, None,
+                       note=f"{block_label} end (actual {block_clock.getTime():.1f}s)")
+        self.log_marker_stats(block_label)
+        if self.traj is not None: self.traj.flush()
+        self.sync_logs()
+
+    def rest_screen(self, secs, frame_phase):
+        self.set_frame_phase(frame_phase)
+        rest_clock = self.core.Clock(); shown = None
+        while rest_clock.getTime() < secs:
+            left = int(secs - rest_clock.getTime())
+            if left != shown: self.msg_text.text = f"Rest\n\nNext block in {left} seconds..."
+            self.present([self.msg_text], redraw=(left != shown)); shown = left
+            if self.kb.getKeys(['escape'], waitRelease=False): self.quit()
+        self.set_frame_phase(None)
+
+    # ===== plan =====
+    def plan_from_keys(self, plan_keys):
+        # stored plan (schedule file or checkpoint): [[tag, block_id, [key, ...]], ...]
+        blocks = [(tag, idx, self.source.get_many(keys)) for tag, idx, keys in plan_keys]
+        print(f"[PLAN] Stored plan: {' '.join(f'{t}{i}' for t, i, _ in blocks)}")
+        return blocks
+
+    def plan_keys(self, plan):
+        def as_json(k): return list(k) if isinstance(k, tuple) else k
+        return [[tag, idx, [as_json(self.source.key(q)) for q in qs]] for tag, idx, qs in plan]
+
+    def build_plan(self):
+        if not self.source.exists():
+            print(f"ERROR: Questions file not found: {self.source.path}"); self.quit()
+        if "prepared" not in self.prep: self.source.prepare()
+        overhead = item_overhead_secs(self.cfg)
+        def log(label, note): self.log_event("plan", label, -1, {}, "PLAN", 0, None, note=note)
+        return BUILDERS[self.cfg["blocks"]["builder"]](self.source, self.cfg["blocks"], overhead, log)
+
+    def start_session(self):
+        args = self.args
+        state = load_checkpoint(self.ckpt_path) if args.resume else None
+        if state is not None and state.get("finished"):
+            print(f"[CKPT] {self.ckpt_path} is a finished session; starting a new one."); state = None
+        elif state is not None and state.get("config", self.cfg["name"]) != self.cfg["name"]:
+            print(f"[CKPT] {self.ckpt_path} belongs to config {state['config']}; starting a new session.")
+            state = None
+        elif args.resume and state is None:
+            print(f"[CKPT] No checkpoint at {self.ckpt_path}; starting a new session.")
+        self.checkpointer = Checkpointer(self.ckpt_path)
+
+        if state is not None:
+            self.session_state = state
+            set_rng_state(state["rng"])
+            plan = self.plan_from_keys(state["plan"])
+            mname, mcode, _ = self.send_marker("SESSION_RESUME")
+            self.log_event("experiment", "RESUME", -1, {}, mname, mcode, None,
+                           note=f"Resumed from {self.ckpt_path}; previous log {state['logs'][-1]}; "
+                                f"blocks done {state['blocks_done']}")
+            state["logs"].append(self.log_path)
+        else:
+            schedule = self.prep.get("schedule")
+            if schedule is None and self.schedule_file and "schedule" not in self.prep:
+                from cohort_schedules import lookup_schedule, plan_settings
+                schedule = lookup_schedule(self.schedule_file, self.exp_info["participant"], self.source.path,
+                                           plan_settings(self.cfg))
+            session_seed = schedule["seed"] if schedule else random.randrange(2**31)
+            random.seed(session_seed)   # ITIs (and a runtime plan) are reproducible from the logged seed
+            self.log_event("plan", "PRE", -1, {}, "SEED", 0, None,
+                           note=f"seed={session_seed}; plan={'precomputed ' + self.schedule_file if schedule else 'runtime'}")
+            plan = self.plan_from_keys(schedule["blocks"]) if schedule else self.build_plan()
+            self.session_state = {
+                "participant": self.exp_info["participant"], "session": self.exp_info["session"],
+                "config": self.cfg["name"], "seed": session_seed,
+                "plan": self.plan_keys(plan), "questionnaire": None, "blocks_done": [],
+                "trials_done": {}, "block_elapsed": {}, "logs": [self.log_path], "finished": False,
+            }
+        self.save_checkpoint()
+        return plan
+
+    # ===== session =====
+    def run(self):
+        self._import_psychopy()
+        self._paths()
+        self.startup_stage("imports")
+        self._dialog()
+        self.startup_stage("dialog")
+        # background start-up work runs while the window is created
+        prep_thread = threading.Thread(target=self._prep_startup, name="startup-prep", daemon=True)
+        prep_thread.start()
+        self.open_window()
+        self.startup_stage("window")
+        prep_thread.join()
+        self.startup_stage("wait_background")
+        self.markers = self.prep["markers"]
+        self.open_log()
+        self.startup_stage("log_open")
+
+        cfg, bcfg = self.cfg, self.cfg["blocks"]
+        self.log_event("experiment", "START", -1, {}, "EXP_START", 0, None,
+                       note=f"Experiment started at {time.strftime('%Y-%m-%d %H:%M:%S')}; config {cfg['name']} "
+                            f"({os.path.basename(cfg['source_path'])})")
+        for kind, err in self.markers.failed:
+            self.log_event("experiment", "START", -1, {}, "MARKER_BACKEND_FAILED", 0, None, note=f"{kind}: {err}")
+        plan = self.start_session()
+        state = self.session_state
+        remaining_plan = [b for b in plan if f"{b[0]}{b[1]}" not in state["blocks_done"]]
+        self.startup_stage("plan")
+        self.log_startup()
+
+        session_markers = cfg["markers"]["session_markers"]
+        if session_markers:
+            mname, mcode, _ = self.send_marker(session_markers[0])
+            self.log_event("block", "ALL", -1, {}, mname, mcode, None, note="Experiment start")
+        # build/warm the trial stimuli while the welcome and questionnaire screens are up
+        self.background_tasks.append(self.preload_trial_stims(remaining_plan))
+        self.show_message(cfg["messages"]["welcome"])
+        if cfg["questionnaire"]["before"] and state["questionnaire"] is None:
+            state["questionnaire"] = run_questionnaire(self, block_label="PRE")
+            self.save_checkpoint()
+        self.finish_background()
+
+        n_blocks = len(plan)
+        for tag, idx, questions in remaining_plan:
+            label = f"{tag}{idx}"
+            position = plan.index((tag, idx, questions)) + 1
+            if bcfg["intro_message"]:
+                self.show_message(bcfg["intro_message"].format(label=label, index=position, n_blocks=n_blocks))
+            if bcfg["countdown_secs"] > 0: self.countdown(label, bcfg["countdown_secs"])
+            self.run_block(label, questions)
+            state["blocks_done"].append(label)
+            self.save_checkpoint()
+            after = cfg["questionnaire"]["after_block"]
+            if after is not None and str(after) == label:
+                run_questionnaire(self, block_label=f"{label}_QNR")
+            if bcfg["rest_between_secs"] > 0 and position < n_blocks:
+                mname, mcode, _ = self.send_marker("BLOCK_REST", on_flip=True)
+                self.log_event("block_rest", label, -1, {}, mname, mcode, None,
+                               note=f"{bcfg['rest_between_secs']:.0f}s rest after block {label}", on_flip=True)
+                self.rest_screen(bcfg["rest_between_secs"], "block_rest")
+
+        if session_markers:
+            mname, mcode, _ = self.send_marker(session_markers[1])
+            self.log_event("block", "ALL", -1, {}, mname, mcode, None, note="Experiment end")
+        self.log_event("experiment", "END", -1, {}, "EXP_END", 0, None,
+                       note=f"Experiment ended at {time.strftime('%Y-%m-%d %H:%M:%S')}")
+        state["finished"] = True
+        self.save_checkpoint()
+        self.show_message(cfg["messages"]["goodbye"])
+        self.quit()
+
+
+def run(config_path, argv=None, t0=None):
+    """Load config_path (or --config), apply overrides and run one session."""
+    t0 = t0 if t0 is not None else time.perf_counter()
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    overrides = {}
+    if args.set: overrides.update(json.loads(args.set))
+    if args.simulate and args.sim_config:
+        # design overrides for batch runs (see sim_batch.py)
+        overrides.update(json.loads(args.sim_config))
+    cfg = load_config(args.config or config_path, overrides)
+    Experiment(cfg, args, t0).run()
@@ -0,0 +1,139 @@
+# enem_engine/inputs.py
+# Timestamped responses, independent of the frame loop.
+#
+# Keyboard: psychopy.hardware.keyboard already stamps every key on its own thread;
+#   keys() hands those stamps (tDown) back on the experiment clock instead of the time
+#   the loop happened to poll. A response is the press, also when the screen only
+#   advances on the release (waitRelease).
+# Mouse: a sampler thread reads the buttons and position at input.mouse_hz and turns
+#   button changes into press/release events stamped at the sample, so a click's time
+#   does not depend on when the next frame is flipped. Button state reaches PsychoPy
+#   when window events are dispatched (every idle poll on static screens, every flip
+#   otherwise). Without the thread (input.thread false; "auto" uses it with pyglet
+#   windows only, as glfw wants its input calls on the main thread) the engine
+#   samples on every idle poll and input check.
+#
+# Times are seconds on the experiment clock (exp.clock).
+
+import threading, time
+
+
+class Press:
+    __slots__ = ("device", "name", "t", "pos", "down")
+
+    def __init__(self, device, name, t, pos=None, down=True):
+        self.device, self.name, self.t, self.pos, self.down = device, name, t, pos, down
+
+    def __repr__(self):
+        return f"Press({self.device}:{self.name}{'' if self.down else ' up'} @ {self.t:.6f})"
+
+
+class InputSampler:
+    def __init__(self, clock, mouse, kb, mouse_hz=500, thread=True):
+        self.clock, self.mouse, self.kb = clock, mouse, kb
+        self.period = 1.0 / mouse_hz if mouse_hz else 0.002
+        self._lock = threading.Lock()
+        self._events = []            # mouse Press (down and up), oldest first
+        self._buttons = (False, False, False)
+        self._pos = (0.0, 0.0)
+        self.samples = 0
+        self._listened = float("-inf")   # time of the last sample handed to the listeners
+        self.listeners = []          # fn(t, pos, buttons) per sample (trajectory recording);
+                                     # replaced, not mutated, so the thread can read it unlocked
+        self._stop = threading.Event()
+        self._thread = None
+        if thread:
+            self._thread = threading.Thread(target=self._run, name="input-sampler", daemon=True)
+            self._thread.start()
+
+    @property
+    def threaded(self):
+        return self._thread is not None
+
+    # ----- mouse -----
+    def _run(self):
+        next_t = time.perf_counter()
+        while not self._stop.is_set():
+            self.sample()
+            next_t += self.period
+            delay = next_t - time.perf_counter()
+            if delay > 0: time.sleep(delay)
+            else: next_t = time.perf_counter()   # fell behind: do not burst
+
+    def sample(self):
+        try:
+            b = self.mouse.getPressed()
+            buttons = (bool(b[0]), bool(b[1]), bool(b[2]))
+            changed = buttons != self._buttons
+            # the position only matters for a button change or a trajectory listener
+            pos = tuple(self.mouse.getPos()) if changed or self.listeners else self._pos
+        except Exception:
+            return
+        t = self.clock.getTime()
+        self.samples += 1
+        if changed:
+            with self._lock:
+                for i, (was, now) in enumerate(zip(self._buttons, buttons)):
+                    if was != now: self._events.append(Press("mouse", i, t, pos, now))
+                self._buttons = buttons
+        self._pos = pos
+        # at most mouse_hz, however often the loop polls without the thread
+        if self.listeners and t - self._listened >= 0.9 * self.period:
+            self._listened = t
+            for fn in self.listeners: fn(t, pos, buttons)
+
+    def poll(self):
+        """Samples now unless the thread does."""
+        if self._thread is None: self.sample()
+
+    def mouse_events(self, down=True):
+        """Takes the pending mouse presses (down=True) or releases (down=False), oldest first."""
+        self.poll()
+        if not self._events: return []
+        with self._lock:
+            out = [e for e in self._events if e.down == down]
+            self._events = [e for e in self._events if e.down != down]
+        return out
+
+    def click_in(self, shapes):
+        """(index of the shape, Press) for the first left-button press inside one of
+        shapes, or (None, None). Presses elsewhere are dropped."""
+        for e in self.mouse_events(down=True):
+            if e.name != 0: continue
+            for i, shape in enumerate(shapes):
+                if shape is not None and shape.contains(e.pos): return i, e
+        return None, None
+
+    def buttons_down(self):
+        self.poll()
+        return any(self._buttons)
+
+    def wait_release(self, idle=None):
+        """Blocks until every mouse button is up (idle() keeps window events flowing);
+        returns the time of the last release, or None if nothing was held."""
+        if not self.buttons_down(): return None
+        while self.buttons_down():
+            if idle: idle()
+            else: time.sleep(self.period)
+        ups = self.mouse_events(down=False)
+        return ups[-1].t if ups else self.clock.getTime()
+
+    def clear(self):
+        self.poll()
+        with self._lock:
+            self._events = []
+
+    # ----- keyboard -----
+    def _key_time(self, k):
+        t_down = getattr(k, "tDown", None)
+        if t_down is None: return self.clock.getTime()
+        return t_down - self.clock.getLastResetTime()
+
+    def keys(self, key_list=None, wait_release=False):
+        """kb.getKeys as Press events stamped with the backend's key-down time."""
+        return [Press("key", k.name, self._key_time(k))
+                for k in self.kb.getKeys(key_list, waitRelease=wait_release)]
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None: self._thread.join(timeout=1.0)
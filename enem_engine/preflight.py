@@ -0,0 +1,298 @@
+# enem_engine/preflight.py
+# Off-line layout check of every item of the question file at the target window size.
+#
+#   python -m enem_engine.preflight configs/v3.json [--jobs N] [--render] [--set JSON] [--size 1920x1080]
+#
+# Every item is laid out from the config's layout section: text and stem blocks and
+# option rows (options sharing a y) are movable units, prompt and button are fixed.
+# Units are placed top to bottom; a unit that would overlap a unit above it that is on
+# screen at the same time (same phase) is pushed down below it, and a first unit whose
+# top is off-screen is pulled down. If something still overlaps or leaves the window,
+# the item's text/stem/option letters are made smaller step by step (layout.autofit,
+# down to autofit.min_scale) and it is laid out again; what still does not fit is
+# reported. Block sizes come from the line cache (textcache.LineCache); --render
+# measures them with real TextStims in a PsychoPy window per worker process.
+#
+# Writes <questions file>.layout.json (per item: positions, letter heights, bounding
+# boxes, issues) and prints the items with issues. The engine loads the file when its
+# signature (window size, layout, text heights, phases) matches the config and the
+# window it actually opened (fullscreen: the screen's size; lay out for it with --size)
+# and places each item at its pre-flight positions instead of the configured offsets;
+# items not in the file are fitted the same way at preload (Layout.fit), from measured
+# stimuli.
+
+import argparse, hashlib, json, os, sys, time
+from concurrent.futures import ProcessPoolExecutor
+
+from .config import BASE_DIR, ConfigError, load_config, resolve_path
+from .sources import open_source
+from .stimuli import Geometry, LETTERS
+from .textcache import LineCache
+
+LAYOUT_VERSION = 1
+
+
+def layout_path(data_path):
+    return data_path + ".layout.json"
+
+
+def signature(cfg, size=None):
+    """Validity key of a layout file; size is the window size (default display.size)."""
+    disp = cfg["display"]
+    size = [int(v) for v in (size if size is not None else disp["size"])]
+    key = [size, cfg["layout"], disp["stem_text_height"], disp["gen_text_height"],
+           disp["option_text_height"], [p["show"] for p in cfg["trial"]["phases"]]]
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _box(x, y, w, h, anchor):
+    x0 = x if anchor == "left" else x - w / 2.0
+    return [x0, y - h / 2.0, x0 + w, y + h / 2.0]
+
+
+def _overlap(a, b, gap=0.0):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] + gap and b[1] < a[3] + gap
+
+
+def plan_item(geo, fields, metrics, gap, margin, heights=None):
+    """Placement of one item: {"pos", "bbox", "issues", "moved"}. metrics(text, height,
+    wrap, part) -> {"w", "h", ...} gives the extent of a text block (part: "text",
+    "stem", "prompt" or ("label", i)); heights overrides the text/stem/option letter
+    heights."""
+    lay = geo.lay
+    heights = heights or {}
+    phases = [set(show) for show in geo.phases]
+    seen_in = lambda slots: {i for i, show in enumerate(phases) if show & slots}
+    units = []   # [name, phases, [(part, box)], center y]
+
+    for slot in ("text", "stem"):
+        if slot in geo.slots and fields.get(slot):
+            x, y = geo.pos(lay[slot]["pos"])
+            m = metrics(fields[slot], heights.get(slot, geo.text_height(slot)), geo.wrap, slot)
+            units.append([slot, seen_in({slot}), [(slot, _box(x, y, m["w"], m["h"], lay[slot].get("anchor")))], y])
+    if "options" in geo.slots:
+        rows = {}
+        bw, bh = lay["options"]["box_size"]
+        anchor = lay["options"].get("anchor")
+        for i, ((x, y), opt) in enumerate(zip(geo.option_positions(), fields["options"])):
+            lx, ly = geo.option_label_pos(x, y)
+            bx, by = geo.option_box_pos(x, y)
+            m = metrics(f"{LETTERS[i]}) {opt}", heights.get("option", geo.heights["option"]), geo.option_wrap(),
+                        ("label", i))
+            rows.setdefault(ly, []).extend([(("label", i), _box(lx, ly, m["w"], m["h"], anchor)),
+                                            (("box", i), _box(bx, by, bw, bh, None))])
+        for y, parts in rows.items():
+            units.append([f"options@{y:g}", seen_in({"options"}), parts, y])
+    fixed = []
+    if "prompt" in geo.slots and lay["prompt"].get("text"):
+        x, y = geo.pos(lay["prompt"]["pos"])
+        m = metrics(lay["prompt"]["text"], geo.text_height("prompt"), None, "prompt")
+        fixed.append(["prompt", seen_in({"prompt"}), [("prompt", _box(x, y, m["w"], m["h"], None))], y])
+    if "button" in geo.slots:
+        (x, y), (w, h) = geo.pos(lay["button"]["pos"]), lay["button"]["size"]
+        fixed.append(["button", seen_in({"button"}), [("button", _box(x, y, w, h, None))], y])
+
+    # place movable units top to bottom
+    top = lambda u: max(b[3] for _, b in u[2])
+    bottom = lambda u: min(b[1] for _, b in u[2])
+    shift = lambda u, dy: [(p, [b[0], b[1] + dy, b[2], b[3] + dy]) for p, b in u[2]]
+    placed, moved = [], False
+    for u in sorted(units, key=top, reverse=True):
+        dy = 0.0
+        above = [v for v in placed if v[1] & u[1]]
+        if not above and top(u) > geo.H / 2.0 - margin:
+            dy = geo.H / 2.0 - margin - top(u)
+        for _ in range(len(placed) + 1):
+            parts = shift(u, dy)
+            hit = [bottom(v) for v in above if any(_overlap(b, c, gap) for _, b in parts for _, c in v[2])]
+            if not hit: break
+            dy = min(hit) - gap - max(b[3] for _, b in u[2])
+        if dy:
+            u[2], u[3], moved = shift(u, dy), u[3] + dy, True
+        placed.append(u)
+
+    # what still collides or is clipped
+    issues = []
+    everything = placed + fixed
+    for i, u in enumerate(everything):
+        for p, b in u[2]:
+            if b[0] < -geo.W / 2.0 or b[2] > geo.W / 2.0 or b[1] < -geo.H / 2.0 or b[3] > geo.H / 2.0:
+                issues.append(f"clip:{_part_name(u[0], p)}")
+        for v in everything[i + 1:]:
+            if not u[1] & v[1]: continue
+            for p, b in u[2]:
+                for q, c in v[2]:
+                    if _overlap(b, c): issues.append(f"overlap:{_part_name(u[0], p)}/{_part_name(v[0], q)}")
+    for u in placed:   # labels over other options' boxes within a row
+        for p, b in u[2]:
+            for q, c in u[2]:
+                if p < q and p[1] != q[1] and _overlap(b, c):
+                    issues.append(f"overlap:{_part_name(u[0], p)}/{_part_name(u[0], q)}")
+
+    pos, bbox = {}, {}
+    for u in placed:
+        for p, b in u[2]:
+            if isinstance(p, str):
+                pos[p] = [geo.pos(lay[p]["pos"])[0], u[3]]
+                bbox[p] = [round(v, 1) for v in b]
+            else:
+                kind, i = p
+                x, y = geo.option_positions()[i]
+                x = (geo.option_label_pos if kind == "label" else geo.option_box_pos)(x, y)[0]
+                key = "options" if kind == "label" else "boxes"
+                pos.setdefault(key, [None] * len(LETTERS))[i] = [x, b[1] + (b[3] - b[1]) / 2.0]
+                bbox.setdefault(key, [None] * len(LETTERS))[i] = [round(v, 1) for v in b]
+    for key in ("options", "boxes"):
+        if key in pos: pos[key] = [p for p in pos[key] if p is not None]
+    return {"pos": pos, "bbox": bbox, "issues": sorted(set(issues)), "moved": moved}
+
+
+def fit_item(geo, fields, metrics, gap, margin, min_scale=1.0, step=0.05):
+    """plan_item, shrinking the item's text/stem/option heights in steps of `step`
+    (down to min_scale) while the placement still overlaps or clips."""
+    scale, heights = 1.0, None
+    while True:
+        plan = plan_item(geo, fields, metrics, gap, margin, heights)
+        if not plan["issues"] or scale - step < min_scale - 1e-9: break
+        scale = round(scale - step, 4)
+        heights = {slot: round(geo.text_height(slot) * scale, 1) for slot in ("text", "stem")}
+        heights["option"] = round(geo.heights["option"] * scale, 1)
+    plan["scale"] = scale
+    if heights: plan["heights"] = heights
+    return plan
+
+
+def _part_name(unit, part):
+    return part if isinstance(part, str) else f"{part[0]}_{LETTERS[part[1]]}"
+
+
+# ===== workers =====
+_worker = {}
+
+
+def _init_worker(cfg, size, entries, render):
+    geo = Geometry(cfg, size)
+    lines = LineCache(None); lines.entries = entries
+    measure = None
+    if render:
+        from psychopy import visual
+        win = visual.Window(size=size, fullscr=False, units="pix", allowGUI=False,
+                            color=cfg["display"]["color"], winType=cfg["display"]["win_type"] or "pyglet")
+
+        def measure(text, height, wrap):
+            stim = visual.TextStim(win, text=text, height=height, wrapWidth=wrap, color=geo.color)
+            stim.draw(); win.clearBuffer()
+            return lines.record(stim)
+    fit = cfg["layout"]["autofit"]
+    _worker.update(geo=geo, lines=lines, measure=measure, gap=cfg["layout"]["preflight"]["gap"],
+                   margin=cfg["layout"]["preflight"]["margin"],
+                   min_scale=fit["min_scale"] if fit["use"] else 1.0, step=fit["step"])
+
+
+def _metrics(text, height, wrap, part=None):
+    lines, measure = _worker["lines"], _worker["measure"]
+    e = lines.get(text, height, wrap)
+    if e is not None and (e["measured"] or measure is None): return e
+    return measure(text, height, wrap) if measure else lines.metrics(text, height, wrap)
+
+
+def _plan_chunk(items):
+    w = _worker
+    out = [(item_id, fit_item(w["geo"], fields, _metrics, w["gap"], w["margin"], w["min_scale"], w["step"]))
+           for item_id, fields in items]
+    measured = {k: e for k, e in _worker["lines"].entries.items() if e["measured"]}
+    return out, measured
+
+
+def _chunks(xs, n):
+    size = max(1, (len(xs) + n - 1) // n)
+    return [xs[i:i + size] for i in range(0, len(xs), size)]
+
+
+# ===== engine side =====
+def load_placements(path, cfg, size):
+    """{item id: placement} from a layout file made for this config and window size
+    (the opened window's, not necessarily display.size), else {}."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != LAYOUT_VERSION or data.get("signature") != signature(cfg, size):
+        made = "x".join(str(v) for v in data.get("window") or ())
+        print(f"[LAYOUT] {os.path.basename(path)} was made for another window size/layout "
+              f"({made or '?'}, window {int(size[0])}x{int(size[1])}); using the configured positions")
+        return {}
+    return {item_id: {"pos": item["pos"], "heights": item.get("heights")} for item_id, item in data["items"].items()}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m enem_engine.preflight",
+                                 description="Lay out every item at the target window size and report overlaps/clipping.")
+    ap.add_argument("config")
+    ap.add_argument("--set", default=None, help="JSON object of dotted config overrides")
+    ap.add_argument("--data", default=None, help="question file (default: the config's data.path)")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="worker processes")
+    ap.add_argument("--render", action="store_true", help="measure text blocks in a PsychoPy window (per worker)")
+    ap.add_argument("--size", default=None,
+                    help="window size WxH to lay out for (default display.size; fullscreen: the lab screen's)")
+    ap.add_argument("-o", "--out", default=None, help="layout file (default <questions file>.layout.json)")
+    args = ap.parse_args(argv)
+    try:
+        cfg = load_config(args.config, json.loads(args.set) if args.set else None)
+    except (ConfigError, ValueError) as e:
+        print(f"[PREFLIGHT] {e}"); sys.exit(2)
+    try:
+        size = [int(v) for v in args.size.lower().split("x")] if args.size else list(cfg["display"]["size"])
+        if len(size) != 2: raise ValueError
+    except ValueError:
+        print(f"[PREFLIGHT] --size must be WxH, not {args.size!r}"); sys.exit(2)
+
+    data_path = args.data or resolve_path(cfg["data"]["path"])
+    if not os.path.exists(data_path):
+        data_path = os.path.join(BASE_DIR, os.path.basename(data_path.replace("\\", "/")))
+    source = open_source(cfg["data"], data_path)
+    if cfg["data"]["source"] == "csv":
+        source.prepare(); questions = list(source.rows.values())
+    else:
+        questions = source.get_many(source.index())
+    items = [(source.log_fields(q)["id"], source.fields(q)) for q in questions]
+    source.close()
+
+    t0 = time.perf_counter()
+    lines = LineCache(data_path + ".lines.json")
+    jobs = max(1, min(args.jobs, len(items)))
+    results = []
+    if jobs == 1:
+        _init_worker(cfg, size, lines.entries, args.render)
+        plans, measured = _plan_chunk(items)
+        results.append((plans, measured))
+    else:
+        with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(cfg, size, lines.entries, args.render)) as ex:
+            results = list(ex.map(_plan_chunk, _chunks(items, jobs * 4)))
+    plans = {}
+    for chunk, measured in results:
+        plans.update(chunk)
+        for k, e in measured.items():
+            if k not in lines.entries or not lines.entries[k]["measured"]:
+                lines.entries[k] = e; lines._dirty = True
+    lines.save()
+
+    out = args.out or layout_path(data_path)
+    with open(out + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"version": LAYOUT_VERSION, "signature": signature(cfg, size), "config": cfg["name"],
+                   "window": size, "items": plans}, f)
+    os.replace(out + ".tmp", out)
+    bad = {k: p for k, p in plans.items() if p["issues"]}
+    moved = sum(1 for p in plans.values() if p["moved"])
+    scaled = sum(1 for p in plans.values() if p["scale"] < 1.0)
+    print(f"[PREFLIGHT] {len(plans)} items at {size[0]}x{size[1]} "
+          f"({jobs} jobs, {'rendered' if args.render else 'line cache/estimate'}) in {time.perf_counter() - t0:.2f}s: "
+          f"{moved} re-placed, {scaled} with smaller text, {len(bad)} with issues -> {out}")
+    for item_id, p in sorted(bad.items()):
+        print(f"[PREFLIGHT]   {item_id}: {', '.join(p['issues'])}")
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
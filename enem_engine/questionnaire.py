@@ -0,0 +1,103 @@
+# enem_engine/questionnaire.py
+# Inline socio-demographic questionnaire (config "questionnaire.items").
+#
+# Item types: "choice" (numbered buttons in choice_columns columns; number key or
+# click), "scale" (scale_min..scale_max number keys, "left|right" scale_labels) and
+# "text" (typed, ENTER confirms). SPACE skips an optional choice/scale item.
+# Prompts, labels and boxes come from the layout's StimCache, so an item shown again
+# (after every block with questionnaire.after_block) is not laid out again. Answer
+# times are the input layer's press stamps (inputs.py), logged as the item row's t_abs.
+# Screens are shown with exp.present() like the trial screens (frame timing, flip-locked
+# markers and rows; unchanged screens are only polled).
+
+
+def _choice_positions(n, columns, win_w):
+    if columns <= 1: return [(0, 100 - i * 80) for i in range(n)]
+    maxw = min(700, int(0.85 * win_w))
+    xs = [-maxw // 4, maxw // 4]
+    return [(xs[i % 2], 120 - (i // 2) * 80) for i in range(n)]
+
+
+def run_questionnaire(exp, block_label="QNR"):
+    qcfg = exp.cfg["questionnaire"]
+    items = qcfg["items"]
+    answers = {}
+    if not items: return answers
+    visual, win, lay = exp.visual, exp.win, exp.layout
+    cache = lay.cache
+    color, fill = lay.color, exp.cfg["display"]["box_fill"]
+    gen_h, opt_h = lay.heights["gen"], lay.heights["option"]
+    mname, mcode, _ = exp.send_marker("QUESTIONNAIRE_ON")
+    exp.log_event("questionnaire", block_label, -1, {}, mname, mcode, None, note="Questionnaire start")
+    exp.show_message(qcfg["intro"])
+    exp.set_frame_phase("questionnaire")
+    input_box = cache.rect(lay.wrap, 60, (0, -150), fill, color)
+    input_text = visual.TextStim(win, text="", color=color, height=gen_h, pos=(0, -150), wrapWidth=lay.wrap * 0.95)
+    for q in items:
+        qid = q.get("qid", "").strip(); text = q.get("text", "").strip()
+        qtype = q.get("type", "text").strip().lower()
+        opts = [o.strip() for o in q.get("options", "").split(",") if o.strip()]
+        req = (q.get("required", "no").strip().lower() == "yes")
+        answer = None; t_start = exp.clock.getTime(); t_answer = None
+        if qtype == "choice" and opts:
+            boxes, labels = [], []
+            width = 600 if qcfg["choice_columns"] > 1 else 400
+            for i, (x, y) in enumerate(_choice_positions(len(opts), qcfg["choice_columns"], lay.W)):
+                boxes.append(cache.rect(width, 60, (x, y), fill, color))
+                labels.append(cache.text(f"{i+1}) {opts[i]}", opt_h, (x, y), color, wrap=lay.wrap * 0.9))
+            screen = [cache.text(text, gen_h, (0, 200), color, wrap=lay.wrap)]
+            screen += [s for pair in zip(boxes, labels) for s in pair]
+            if qcfg.get("choice_hint"):
+                screen.append(cache.text(qcfg["choice_hint"], opt_h, (0, -260), color))
+            redraw = True
+            while answer is None:
+                exp.step_background()
+                exp.present(screen, redraw); redraw = False
+                i, press = exp.inputs.click_in(boxes)
+                if press is not None:
+                    answer, t_answer = opts[i], press.t; break
+                keys = exp.inputs.keys([str(i+1) for i in range(len(opts))] + ['escape', 'space'])
+                if keys:
+                    name, t_answer = keys[0].name, keys[0].t
+                    if name == 'escape': exp.quit()
+                    if name == 'space' and not req: answer = ""
+                    elif name.isdigit() and 0 <= int(name) - 1 < len(opts): answer = opts[int(name) - 1]
+        elif qtype == "scale" and str(q.get("scale_min", "")).strip() and str(q.get("scale_max", "")).strip():
+            try: lo, hi = int(q["scale_min"]), int(q["scale_max"])
+            except ValueError: lo, hi = 1, 7
+            anchors = [a.strip() for a in q.get("scale_labels", "").split("|")] + ["", ""]
+            screen = [cache.text(f"{text}\n\nUse number keys {lo}..{hi}.", gen_h, (0, 120), color, wrap=lay.wrap),
+                      cache.text(anchors[0], opt_h, (-300, 40), color),
+                      cache.text(anchors[1], opt_h, (300, 40), color)]
+            screen += [cache.text(str(v), opt_h, (-300 + 600 * (v - lo) / max(1, hi - lo), 0), color)
+                       for v in range(lo, hi + 1)]
+            redraw = True
+            while answer is None:
+                exp.step_background()
+                exp.present(screen, redraw); redraw = False
+                keys = exp.inputs.keys([str(v) for v in range(lo, hi + 1)] + ['escape', 'space'])
+                if keys:
+                    name, t_answer = keys[0].name, keys[0].t
+                    if name == 'escape': exp.quit()
+                    if name == 'space' and not req: answer = ""
+                    elif name.isdigit() and lo <= int(name) <= hi: answer = name
+        else:
+            prompt = cache.text(f"{text}\n(Type your answer. ENTER to confirm.)", gen_h, (0, 60), color, wrap=lay.wrap)
+            typed, shown = "", None
+            while True:
+                exp.step_background()
+                if typed != shown: input_text.text = typed
+                exp.present([prompt, input_box, input_text], redraw=typed != shown); shown = typed
+                for k in exp.inputs.keys():
+                    if k.name == 'escape': exp.quit()
+                    elif k.name == 'backspace': typed = typed[:-1]
+                    elif k.name in ('return', 'num_enter'):
+                        if not (req and len(typed.strip()) == 0): answer, t_answer = typed, k.t; break
+                    elif len(k.name) == 1: typed += k.name
+                if answer is not None: break
+        exp.log_event("questionnaire_item", block_label, -1, {"qid": qid}, "QNR_ITEM", 0, t_start,
+                      choice=answer if answer is not None else "", note=f"type={qtype}", t_abs=t_answer)
+        answers[qid] = answer if answer is not None else ""
+    mname, mcode, _ = exp.send_marker("QUESTIONNAIRE_OFF")
+    exp.log_event("questionnaire", block_label, -1, {}, mname, mcode, None, note="Questionnaire end")
+    return answers
@@ -0,0 +1,124 @@
+# enem_engine/sources.py
+# Question data sources. Both give the engine the same view of an item:
+#   key(q)     JSON-friendly identity (stored in checkpoints and schedules)
+#   fields(q)  {"text", "stem", "options" (A-E), "correct"} for the trial screens
+#   log_fields(q)  question_id / number / year / type / field for the log row
+#
+# BankSource: the ENEM question JSON through the compiled SQLite bank (question_bank.py).
+#   prepare() compiles/checks the store and may run on the start-up thread; the
+#   connection itself is opened on first use, on the thread that uses it.
+# CsvSource: one row per trial (question_id, stem, optionA..E, correct, block); the ids
+#   must be unique.
+
+import csv, os
+
+from question_bank import QuestionBank, compile_bank
+
+OPTION_KEYS = [
+    "question_option_A_translated", "question_option_B_translated",
+    "question_option_C_translated", "question_option_D_translated",
+    "question_option_E_translated",
+]
+CSV_OPTION_KEYS = ["optionA", "optionB", "optionC", "optionD", "optionE"]
+
+
+class BankSource:
+    def __init__(self, path):
+        self.path = path
+        self.store_path = None
+        self._bank = None
+
+    def prepare(self):
+        """Compile the store if the JSON changed; returns True if it was rebuilt."""
+        self.store_path, rebuilt = compile_bank(self.path)
+        if rebuilt: print(f"[BANK] Compiled {self.path} -> {self.store_path}")
+        return rebuilt
+
+    @property
+    def bank(self):
+        if self._bank is None:
+            if self.store_path is None: self.prepare()
+            self._bank = QuestionBank(self.store_path)
+        return self._bank
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def index(self, type=None):
+        return self.bank.index(type=type)
+
+    def get_many(self, keys):
+        return self.bank.get_many(keys)
+
+    @staticmethod
+    def key(q):
+        return (q.get("year"), q.get("color"), q.get("question_number"))
+
+    @staticmethod
+    def fields(q):
+        return {"text": q.get("question_text_translated", ""), "stem": q.get("question_itself_translated", ""),
+                "options": [q.get(k, "") for k in OPTION_KEYS], "correct": str(q.get("correct", "")).strip().upper()}
+
+    @staticmethod
+    def log_fields(q):
+        return {"id": "_".join(str(v) for v in BankSource.key(q)) if "question_number" in q else q.get("qid", ""),
+                "number": q.get("question_number", ""), "year": q.get("year", ""),
+                "type": q.get("type", ""), "field": q.get("field", "")}
+
+    def close(self):
+        if self._bank is not None: self._bank.close(); self._bank = None
+
+
+class CsvSource:
+    def __init__(self, path):
+        self.path = path
+        self.rows = None
+
+    def prepare(self):
+        rows = {}
+        with open(self.path, newline="", encoding="utf-8") as f:
+            for n, row in enumerate(csv.DictReader(f), start=1):
+                qid = row["question_id"] = (row.get("question_id") or "").strip() or f"row{n:03d}"
+                # the id is the item's key in checkpoints; a repeat would silently replace a trial
+                if qid in rows:
+                    raise ValueError(f"{self.path}: question_id {qid!r} appears twice (data row {n}); "
+                                     f"give every row its own id")
+                rows[qid] = row
+        self.rows = rows
+        return False
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def groups(self, column):
+        """{block value: [rows]} in file order."""
+        if self.rows is None: self.prepare()
+        out = {}
+        for row in self.rows.values():
+            out.setdefault((row.get(column) or "1").strip(), []).append(row)
+        return out
+
+    def get_many(self, keys):
+        if self.rows is None: self.prepare()
+        return [self.rows[k] for k in keys]
+
+    @staticmethod
+    def key(q):
+        return q.get("question_id")
+
+    @staticmethod
+    def fields(q):
+        return {"text": "", "stem": (q.get("stem") or "").strip(),
+                "options": [q.get(k, "") for k in CSV_OPTION_KEYS], "correct": (q.get("correct") or "").strip().upper()}
+
+    @staticmethod
+    def log_fields(q):
+        qid = q.get("question_id", q.get("qid", ""))
+        return {"id": qid, "number": qid, "year": "", "type": "", "field": ""}
+
+    def close(self):
+        pass
+
+
+def open_source(data_cfg, path):
+    return (CsvSource if data_cfg["source"] == "csv" else BankSource)(path)
@@ -0,0 +1,148 @@
+# enem_engine/stimuli.py
+# Layout and stimulus construction from the config's "layout" and "display" sections.
+#
+# Screen slots: "text" and "stem" (per-question texts), "options" (A-E labels, per
+# question, over fixed answer boxes), "prompt" (fixed instruction line) and "button"
+# (the reveal button). Only the slots the protocol's phases show are ever built.
+# x positions are numbers or "left+N" / "wrap_left+N"; y values with |y| < 1 are a
+# fraction of the window height. Per-question texts and option labels come from the
+# layout's StimCache (textcache.py), so repeated text is laid out once.
+#
+# Geometry is the window-free part (resolved positions and sizes for a window size),
+# shared with the pre-flight checker (preflight.py). A per-item placement (from the
+# pre-flight file, or fitted at preload by fit()) replaces the configured text/stem/
+# option positions and letter heights for that item; it is computed once per item.
+
+from .textcache import LineCache, StimCache
+
+LETTERS = "ABCDE"
+
+
+class Geometry:
+    def __init__(self, cfg, size):
+        self.lay, self.disp = cfg["layout"], cfg["display"]
+        self.W, self.H = size
+        self.wrap = int(self.W * self.lay["wrap_frac"])
+        self.color = self.disp["text_color"]
+        self.heights = {"stem": self.disp["stem_text_height"], "gen": self.disp["gen_text_height"],
+                        "option": self.disp["option_text_height"]}
+        self.phases = [list(phase["show"]) for phase in cfg["trial"]["phases"]]
+        self.slots = set()
+        for show in self.phases: self.slots.update(show)
+
+    def x(self, v):
+        if isinstance(v, str):
+            base, _, off = v.partition("+")
+            origin = {"left": -self.W // 2, "wrap_left": -self.wrap // 2}[base.strip()]
+            return origin + float(off or 0)
+        return v
+
+    def y(self, v):
+        return v * self.H if -1 < v < 1 and v != 0 else v
+
+    def pos(self, p):
+        return (self.x(p[0]), self.y(p[1]))
+
+    def text_height(self, slot):
+        return self.heights[self.lay[slot].get("size", "gen")]
+
+    def option_wrap(self):
+        return int(self.W * self.lay["options"]["wrap_frac"])
+
+    def option_positions(self):
+        spec = self.lay["options"]
+        if spec.get("positions"): return [tuple(p) for p in spec["positions"]]
+        return [(0, spec["y0"] + i * spec["step"]) for i in range(len(LETTERS))]
+
+    def option_label_pos(self, x, y):
+        spec = self.lay["options"]
+        return (self.x(spec["text_x"]) if spec.get("text_x") is not None else self.x(x), self.y(y))
+
+    def option_box_pos(self, x, y):
+        spec = self.lay["options"]
+        return (self.x(spec["box_x"]) if spec.get("box_x") is not None else self.x(x), self.y(y))
+
+
+class Layout(Geometry):
+    def __init__(self, win, visual, cfg):
+        super().__init__(cfg, win.size)
+        self.win, self.visual = win, visual
+        self.cache = StimCache(visual, win, self.disp["text_cache_size"])
+        self.lines = None        # textcache.LineCache, set by the engine
+        self.placements = {}     # item id -> placement (preflight file or fit()), per session
+        self.fit_stats = {"fitted": 0, "moved": 0, "scaled": 0, "unfit": 0}
+
+    def measure(self, text, height, wrap, part=None):
+        """Extent of a text block: the line cache's measurement, else the boundingBox of
+        the block's stimulus at its configured position, taken from (and left in) the
+        stimulus cache, so an item the fit does not move draws that same stimulus."""
+        if self.lines is None: self.lines = LineCache(None)
+        e = self.lines.get(text, height, wrap)
+        if e is not None and e["measured"]: return e
+        if part is None: return self.lines.metrics(text, height, wrap)
+        if isinstance(part, tuple):
+            x, y = self.option_positions()[part[1]]
+            stim = self._label(text, self.option_label_pos(x, y), height)
+        else:
+            stim = self.text_stim(part, text, height=height)
+        return self.lines.record(stim)
+
+    def fit(self, fields):
+        """Placement for one item (preflight.fit_item on measured blocks)."""
+        from .preflight import fit_item
+        pf, af = self.lay["preflight"], self.lay["autofit"]
+        plan = fit_item(self, fields, self.measure, pf["gap"], pf["margin"], af["min_scale"], af["step"])
+        st = self.fit_stats
+        st["fitted"] += 1; st["moved"] += plan["moved"]; st["scaled"] += plan["scale"] < 1.0
+        st["unfit"] += bool(plan["issues"])
+        return {"pos": plan["pos"], "heights": plan.get("heights")}
+
+    def text_stim(self, slot, text="", pos=None, height=None):
+        spec = self.lay[slot]
+        kwargs = {}
+        if slot in ("text", "stem"): kwargs["alignText"] = spec.get("align", "left")
+        if spec.get("anchor") == "left": kwargs.update(anchorHoriz="left", anchorVert="center")
+        return self.cache.text(text, height or self.text_height(slot), tuple(pos) if pos else self.pos(spec["pos"]), self.color,
+                               wrap=self.wrap if slot in ("text", "stem") else None, **kwargs)
+
+    def message(self):
+        return self.visual.TextStim(self.win, text="", color=self.color, height=self.heights["gen"], pos=(0, 0))
+
+    def button(self):
+        spec = self.lay["button"]
+        rect = self.visual.Rect(self.win, width=spec["size"][0], height=spec["size"][1],
+                                fillColor=self.disp["box_fill"], lineColor=self.color, pos=self.pos(spec["pos"]))
+        label = self.visual.TextStim(self.win, text="", color=self.color, height=self.heights["gen"],
+                                     pos=self.pos(spec["pos"]))
+        return rect, label
+
+    def prompt(self):
+        return self.text_stim("prompt", self.lay["prompt"].get("text", ""))
+
+    def option_boxes(self, positions=None):
+        w, h = self.lay["options"]["box_size"]
+        positions = positions or [self.option_box_pos(x, y) for x, y in self.option_positions()]
+        return [self.cache.rect(w, h, tuple(p), self.disp["box_fill"], self.color) for p in positions]
+
+    def _label(self, text, pos, height=None):
+        kwargs = {"alignText": "left"}
+        if self.lay["options"].get("anchor") == "left": kwargs.update(anchorHoriz="left", anchorVert="center")
+        return self.cache.text(text, height or self.heights["option"], tuple(pos), self.color,
+                               wrap=self.option_wrap(), **kwargs)
+
+    def option_labels(self, options, positions=None, height=None):
+        positions = positions or [self.option_label_pos(x, y) for x, y in self.option_positions()]
+        return [self._label(f"{LETTERS[i]}) {opt}", p, height) for i, (p, opt) in enumerate(zip(positions, options))]
+
+    def trial_stims(self, fields, item_id=None):
+        """Per-question stimuli for the slots the protocol shows, keyed by slot; with a
+        placement for item_id also the item's own answer boxes ("boxes")."""
+        place = self.placements.get(item_id) if item_id is not None else None
+        pos = place["pos"] if place else {}
+        heights = (place or {}).get("heights") or {}
+        stims = {}
+        for slot in ("text", "stem"):
+            if slot in self.slots: stims[slot] = self.text_stim(slot, fields[slot], pos.get(slot), heights.get(slot))
+        stims["options"] = self.option_labels(fields["options"], pos.get("options"), heights.get("option"))
+        if "boxes" in pos: stims["boxes"] = self.option_boxes(pos["boxes"])
+        return stims
@@ -0,0 +1,140 @@
+# enem_engine/textcache.py
+# Reuse of text layout work within and across sessions.
+#
+# StimCache: bounded LRU of ready-made TextStim/Rect objects keyed by everything that
+#   affects their look (text, height, wrap width, anchor/alignment, position, colour).
+#   Repeated text (a question shown again in a later phase, option labels, the
+#   questionnaire's prompts, buttons and boxes) is laid out and uploaded once. Cached
+#   stimuli are shared, so callers must not change them; stimuli whose text changes
+#   (messages, typed input, button labels) are built directly.
+# LineCache: disk cache (<questions file>.lines.json) of each text block's line
+#   breaking: line count and block size per (text, height, wrap width, font). The
+#   legacy TextStim does its own wrapping and does not take precomputed breaks, so
+#   what is kept is the result: measured from the stimulus' boundingBox after its
+#   warm-up draw, estimated from the average glyph width where there is none (the
+#   simulator). Later sessions know every block's extent before anything is drawn.
+
+import hashlib, json, os
+from collections import OrderedDict
+
+GLYPH_W = 0.5       # average glyph width / letter height (estimate only)
+LINE_SPACING = 1.2  # line pitch / letter height
+
+
+class StimCache:
+    def __init__(self, visual, win, max_items=512):
+        self.visual, self.win = visual, win
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def _get(self, key, build):
+        stim = self._items.get(key)
+        if stim is not None:
+            self._items.move_to_end(key); self.hits += 1
+            return stim
+        self.misses += 1
+        stim = self._items[key] = build()
+        if len(self._items) > self.max_items:
+            self._items.popitem(last=False); self.evictions += 1
+        return stim
+
+    def text(self, text, height, pos, color, wrap=None, **kwargs):
+        key = ("text", text, height, wrap, tuple(pos), str(color), tuple(sorted(kwargs.items())))
+        return self._get(key, lambda: self.visual.TextStim(self.win, text=text, color=color, height=height,
+                                                           wrapWidth=wrap, pos=pos, **kwargs))
+
+    def rect(self, width, height, pos, fill, line):
+        key = ("rect", width, height, tuple(pos), str(fill), str(line))
+        return self._get(key, lambda: self.visual.Rect(self.win, width=width, height=height, fillColor=fill,
+                                                       lineColor=line, pos=pos))
+
+    def summary(self):
+        total = self.hits + self.misses
+        rate = f"{100.0 * self.hits / total:.0f}%" if total else "n/a"
+        return (f"hits={self.hits}; misses={self.misses}; hit_rate={rate}; evictions={self.evictions}; "
+                f"size={len(self._items)}/{self.max_items}")
+
+
+def estimate_lines(text, height, wrap):
+    """Greedy word wrap with the average glyph width: (lines, widest line in px)."""
+    if not wrap: return max(1, text.count("\n") + 1), GLYPH_W * height * max(map(len, text.split("\n")))
+    per_line = max(1, int(wrap / (GLYPH_W * height)))
+    lines, widest = 0, 0
+    for para in text.split("\n"):
+        n = 0
+        for word in para.split():
+            need = len(word) if n == 0 else n + 1 + len(word)
+            if need > per_line and n:
+                lines += 1; widest = max(widest, n); n = len(word)
+            else:
+                n = need
+        lines += 1; widest = max(widest, min(n, per_line))
+    return lines, widest * GLYPH_W * height
+
+
+class LineCache:
+    VERSION = 1
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.hits = self.misses = 0
+        self._dirty = False
+        if path is None: return   # in-memory only
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION: self.entries = data["entries"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    @staticmethod
+    def key(text, height, wrap, font=""):
+        return hashlib.sha1(f"{height}|{wrap}|{font}|{text}".encode("utf-8")).hexdigest()[:20]
+
+    def get(self, text, height, wrap, font=""):
+        """{"lines", "w", "h", "measured"} or None."""
+        e = self.entries.get(self.key(text, height, wrap, font))
+        if e is None: self.misses += 1
+        else: self.hits += 1
+        return e
+
+    def metrics(self, text, height, wrap, font=""):
+        """Cached metrics, else the estimate (stored until a measurement replaces it)."""
+        e = self.get(text, height, wrap, font)
+        if e is None:
+            lines, w = estimate_lines(text, height, wrap)
+            e = self.entries[self.key(text, height, wrap, font)] = {
+                "lines": lines, "w": round(w, 1), "h": round(lines * LINE_SPACING * height, 1), "measured": False}
+            self._dirty = True
+        return e
+
+    def record(self, stim, font=""):
+        """Stores the line breaking of a drawn TextStim (measured when it has a boundingBox)."""
+        text, height, wrap = stim.text, stim.height, getattr(stim, "wrapWidth", None)
+        k = self.key(text, height, wrap, font)
+        e = self.entries.get(k)
+        if e is not None and e["measured"]: return e
+        bbox = getattr(stim, "boundingBox", None)
+        if bbox is not None and len(bbox) == 2 and bbox[1] > 0:
+            e = self.entries[k] = {"lines": max(1, int(round(bbox[1] / (LINE_SPACING * height)))),
+                                   "w": round(float(bbox[0]), 1), "h": round(float(bbox[1]), 1), "measured": True}
+            self._dirty = True
+            return e
+        return self.metrics(text, height, wrap, font)
+
+    def save(self):
+        if not self._dirty or self.path is None: return
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"version": self.VERSION, "entries": self.entries}, f)
+            os.replace(tmp, self.path)
+            self._dirty = False
+        except OSError as e:
+            print("[LAYOUT] could not save the line cache:", e)
+
+    def summary(self):
+        measured = sum(1 for e in self.entries.values() if e["measured"])
+        return f"hits={self.hits}; misses={self.misses}; entries={len(self.entries)} ({measured} measured)"
@@ -0,0 +1,221 @@
+# enem_engine/trajectory.py
+# Mouse path of every trial, kept out of the event log.
+#
+# The recorder is an input-sampler listener (inputs.py): during the recorded trial
+# phases (trajectory.phases; all of them by default) every sample that changes the
+# position, the buttons or the phase goes into preallocated NumPy ring buffers (time,
+# x, y, buttons, phase index) sized for trajectory.max_secs at input.mouse_hz, so a
+# resting mouse stores almost nothing; a longer trial overwrites its oldest samples
+# and counts them as dropped. end() closes the trial and derives its summary (time
+# hovering each option box while the options are shown, switches between hovered
+# options, path length), which the engine logs as one "trajectory" row. flush() hands
+# the ended trials to a writer thread (event_log.EventLog's, so the render thread never
+# does the file writes) during the next ITI or at the end of the block; close() also
+# ends a trial still on screen (quit mid-trial), marked aborted. Each trial is one
+# record of the sidecar <log>.traj:
+#
+#   file    = MAGIC, record*
+#   record  = "<4sII" (b"TRAJ", meta JSON length, n samples), meta JSON,
+#             t f64[n], x f32[n], y f32[n], buttons u8[n] (bit i = button i), phase u8[n]
+#   meta    = block, trial, question, phase_names (the protocol's; phase u8 indexes it),
+#             onsets [[name, t]], boxes [[x, y, w, h]], option_phases, dropped, aborted,
+#             summary
+#
+# A truncated last record (crash mid-write) is ignored by the reader.
+#
+#   python -m enem_engine.trajectory logs/enem_blocks_P01_x.traj [-o samples.csv]
+
+import argparse, csv, json, struct, sys, threading
+
+import numpy as np
+
+from event_log import EventLog
+
+MAGIC = b"ENEMTRJ1"
+RECORD = struct.Struct("<4sII")
+FIELDS = (("t", np.float64), ("x", np.float32), ("y", np.float32), ("buttons", np.uint8), ("phase", np.uint8))
+LETTERS = "ABCDE"
+
+
+def box_geometry(shapes):
+    """[[x, y, w, h]] of the option boxes (centre-anchored Rects)."""
+    return [[float(s.pos[0]), float(s.pos[1]), float(s.width), float(s.height)] for s in shapes]
+
+
+def summarize(t, x, y, phase, t_end, boxes, option_phases):
+    """Dwell per option (s), hover switches, entries and path length of one trial."""
+    out = {"samples": int(len(t)), "path_px": 0.0, "switches": 0, "entries": 0, "first": "",
+           "dwell": {LETTERS[i]: 0.0 for i in range(len(boxes))}}
+    if not len(t): return out
+    # each sample holds until the next one (the last until t_end)
+    dt = np.diff(np.append(t, max(t_end, t[-1])))
+    out["path_px"] = round(float(np.hypot(np.diff(x), np.diff(y)).sum()), 1)
+    if not boxes: return out
+    b = np.asarray(boxes, dtype=np.float64)
+    inside = (np.abs(x[:, None] - b[:, 0]) <= b[:, 2] / 2) & (np.abs(y[:, None] - b[:, 1]) <= b[:, 3] / 2)
+    hover = np.where(inside.any(axis=1), inside.argmax(axis=1), -1)
+    hover[~np.isin(phase, option_phases)] = -1
+    on = hover >= 0
+    dwell = np.bincount(hover[on], weights=dt[on], minlength=len(boxes))
+    out["dwell"] = {LETTERS[i]: round(float(d), 4) for i, d in enumerate(dwell)}
+    seq = hover[on]
+    if len(seq):
+        out["switches"] = int(np.count_nonzero(seq[1:] != seq[:-1]))
+        out["first"] = LETTERS[seq[0]]
+    prev = np.concatenate(([-1], hover[:-1]))
+    out["entries"] = int(np.count_nonzero(on & (hover != prev)))
+    return out
+
+
+def summary_note(s):
+    dwell = " ".join(f"{k}={v:.3f}" for k, v in s["dwell"].items())
+    return (f"dwell_s {dwell}; switches={s['switches']}; entries={s['entries']}; first={s['first'] or '-'}; "
+            f"path_px={s['path_px']:.0f}; samples={s['samples']}; dropped={s['dropped']}")
+
+
+class TrajectoryFile(EventLog):
+    """EventLog whose rows are (meta, arrays) trial records, written on its thread."""
+
+    def _open(self, path):
+        f = open(path, "wb")
+        f.write(MAGIC)
+        return f
+
+    def _begin(self):
+        pass
+
+    def _write_rows(self, rows):
+        for meta, arrays in rows:
+            try:
+                blob = json.dumps(meta).encode("utf-8")
+                self._f.write(RECORD.pack(b"TRAJ", len(blob), len(arrays["t"])) + blob)
+                for name, dtype in FIELDS: self._f.write(arrays[name].astype(dtype, copy=False).tobytes())
+            except Exception as e:
+                print("[TRAJ] write error:", e)
+
+
+class TrajectoryRecorder:
+    def __init__(self, path, capacity, phases=None):
+        self.path, self.capacity = path, max(1, int(capacity))
+        self.phases = set(phases) if phases else None   # None = every trial phase
+        self.buf = {name: np.zeros(self.capacity, dtype=dtype) for name, dtype in FIELDS}
+        self._lock = threading.Lock()
+        self._n = 0
+        self._phase = -1          # index in the trial's phases; -1 = not recording
+        self._last = None         # (x, y, buttons, phase) of the last stored sample
+        self.meta = None
+        self.pending = []         # (meta, arrays) of ended trials, handed to the writer by flush()
+        self.trials = self.dropped = 0
+        self.file = TrajectoryFile(path, ())
+
+    def attach(self, inputs):
+        inputs.listeners = inputs.listeners + [self.sample]   # replaced: the sampler thread reads it unlocked
+
+    def sample(self, t, pos, buttons):
+        if self._phase < 0: return
+        with self._lock:
+            if self._phase < 0: return
+            state = (pos[0], pos[1], buttons[0] | buttons[1] << 1 | buttons[2] << 2, self._phase)
+            if state == self._last: return   # unchanged: the stored sample holds
+            self._last = state
+            i = self._n % self.capacity
+            b = self.buf
+            b["t"][i], b["x"][i], b["y"][i], b["buttons"][i], b["phase"][i] = t, *state
+            self._n += 1
+
+    def begin(self, block, trial, question, phases, boxes, option_phases):
+        """Starts a trial; phases are the protocol's phase names, option_phases the
+        indices of those that show the boxes."""
+        with self._lock:
+            self._n, self._phase, self._last = 0, -1, None
+        self.meta = {"block": block, "trial": trial, "question": question, "phase_names": list(phases),
+                     "onsets": [], "boxes": box_geometry(boxes), "option_phases": list(option_phases)}
+
+    def phase(self, i, t):
+        """Phase i of the trial is on screen from t (recorded if it is one of trajectory.phases)."""
+        if self.meta is None: return
+        name = self.meta["phase_names"][i]
+        self.meta["onsets"].append([name, round(t, 6)])
+        with self._lock:
+            self._phase = i if self.phases is None or name in self.phases else -1
+
+    def end(self, t_end, aborted=False):
+        """Stops recording; returns the trial's summary as a log note (the summary and the
+        samples are kept for flush())."""
+        if self.meta is None: return None
+        with self._lock:
+            self._phase = -1
+            n = min(self._n, self.capacity)
+            order = np.arange(self._n - n, self._n) % self.capacity
+            arrays = {name: self.buf[name][order] for name, _ in FIELDS}
+            dropped = self._n - n
+        meta, self.meta = self.meta, None
+        s = summarize(arrays["t"], arrays["x"].astype(np.float64), arrays["y"].astype(np.float64),
+                      arrays["phase"], t_end, meta["boxes"], meta["option_phases"])
+        s["dropped"] = meta["dropped"] = dropped
+        meta["aborted"], meta["summary"] = aborted, s
+        self.pending.append((meta, arrays))
+        self.trials += 1; self.dropped += dropped
+        return summary_note(s)
+
+    def flush(self):
+        if not self.pending or self.file.closed: return
+        pending, self.pending = self.pending, []
+        for record in pending: self.file.writerow(record)
+
+    def close(self, t_end=None):
+        """Ends a trial still open (aborted, at t_end or its last sample), writes out
+        everything and closes the file; returns that trial's log note, or None."""
+        note = None
+        if self.meta is not None:
+            if t_end is None:
+                with self._lock:
+                    t_end = float(self.buf["t"][(self._n - 1) % self.capacity]) if self._n else 0.0
+            note = self.end(t_end, aborted=True)
+        self.flush(); self.file.close()
+        return note
+
+    def summary(self):
+        return f"trials={self.trials}; dropped_samples={self.dropped}; capacity={self.capacity}"
+
+
+def read_trajectories(path):
+    """Yields (meta, {"t", "x", "y", "buttons", "phase"}) per trial of a .traj file."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC: raise ValueError(f"{path}: not a trajectory file")
+        while True:
+            head = f.read(RECORD.size)
+            if len(head) < RECORD.size: return
+            tag, meta_len, n = RECORD.unpack(head)
+            if tag != b"TRAJ": return
+            blob = f.read(meta_len)
+            if len(blob) < meta_len: return
+            arrays = {}
+            for name, dtype in FIELDS:
+                raw = f.read(n * np.dtype(dtype).itemsize)
+                if len(raw) < n * np.dtype(dtype).itemsize: return
+                arrays[name] = np.frombuffer(raw, dtype=dtype)
+            yield json.loads(blob), arrays
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="List (or export) the trials of a trajectory sidecar.")
+    ap.add_argument("path", help="<log>.traj")
+    ap.add_argument("-o", "--out", default=None, help="write every sample to this CSV")
+    args = ap.parse_args(argv)
+    w = f = None
+    if args.out:
+        f = open(args.out, "w", encoding="utf-8", newline="")
+        w = csv.writer(f); w.writerow(["block", "trial", "t", "x", "y", "buttons", "phase"])
+    for meta, a in read_trajectories(args.path):
+        print(f"{meta['block']} #{meta['trial']}: {summary_note(meta['summary'])}")
+        if w is not None:
+            names = meta["phase_names"]
+            for row in zip(a["t"], a["x"], a["y"], a["buttons"], a["phase"]):
+                w.writerow([meta["block"], meta["trial"], f"{row[0]:.6f}", f"{row[1]:.1f}", f"{row[2]:.1f}",
+                            int(row[3]), names[row[4]]])
+    if f is not None: f.close(); print(f"[TRAJ] samples -> {args.out}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
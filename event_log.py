@@ -0,0 +1,102 @@
+# event_log.py
+# Buffered CSV event log used by enem_engine.
+#
+# log_event() only builds the row and puts it on a queue; a writer thread does the
+# csv/disk work, so the stimulus loop never waits on the file system (or on the
+# antivirus scanner hooked into it). Rows reach the OS after every batch; sync()
+# forces them to disk (fsync) and is called at block boundaries. close() drains the
+# queue and is registered with atexit, so escape, core.quit() and uncaught
+# exceptions still get every queued row written. File errors are printed, never
+# raised in the writer thread, and sync()/close() wait at most SYNC_TIMEOUT seconds,
+# so a failing disk cannot hang the session.
+
+import atexit, csv, os, queue, threading
+
+SYNC_TIMEOUT = 5.0   # seconds sync()/close() wait for the writer thread
+
+
+class EventLog:
+    def __init__(self, path, header):
+        self.path = path
+        self.header = list(header)
+        self._f = self._open(path)   # fail here, before the thread starts
+        self._q = queue.Queue()
+        self.closed = False
+        self._thread = threading.Thread(target=self._run, name="event-log", daemon=True)
+        self._thread.start()
+        self._begin()
+        atexit.register(self.close)
+
+    # ----- file format (overridden by columnar_log.ColumnarLog) -----
+    def _open(self, path):
+        f = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(f)
+        return f
+
+    def _begin(self):
+        self.writerow(self.header)
+
+    def _write_rows(self, rows):
+        for row in rows:
+            try:
+                self._writer.writerow(row)
+            except Exception as e:
+                print("[LOG] write error:", e)
+
+    def writerow(self, row):
+        if self.closed:
+            raise ValueError("EventLog is closed")
+        self._q.put(list(row))
+
+    def sync(self, timeout=SYNC_TIMEOUT):
+        """Block until every row queued so far is flushed and fsync'ed; False if the
+        writer thread is gone or did not get there within timeout."""
+        if self.closed: return True
+        if not self._thread.is_alive():
+            print("[LOG] writer thread is not running; rows are not being written")
+            return False
+        done = threading.Event()
+        self._q.put(done)
+        if not done.wait(timeout):
+            print(f"[LOG] sync timed out after {timeout:.0f}s")
+            return False
+        return True
+
+    def close(self):
+        """Write out everything still queued, fsync and close the file. Idempotent."""
+        if self.closed: return
+        self.closed = True
+        atexit.unregister(self.close)   # many logs per process (sim_batch) must not pile up handlers
+        self._q.put(None)
+        self._thread.join(timeout=SYNC_TIMEOUT)
+        if self._thread.is_alive(): print(f"[LOG] {self.path}: writer did not finish within {SYNC_TIMEOUT:.0f}s")
+
+    # ----- writer thread -----
+    def _run(self):
+        while True:
+            batch = [self._q.get()]
+            while True:
+                try: batch.append(self._q.get_nowait())
+                except queue.Empty: break
+            rows = []
+            for item in batch:
+                if isinstance(item, list):
+                    rows.append(item); continue
+                if rows: self._write_rows(rows); rows = []
+                if item is None:
+                    self._sync_file()
+                    try: self._f.close()
+                    except Exception as e: print("[LOG] close error:", e)
+                    return
+                self._sync_file(); item.set()   # sync() marker
+            if rows: self._write_rows(rows)
+            try:
+                self._f.flush()
+            except Exception as e:
+                print("[LOG] flush error:", e)
+
+    def _sync_file(self):
+        try:
+            self._f.flush(); os.fsync(self._f.fileno())
+        except Exception as e:
+            print("[LOG] sync error:", e)
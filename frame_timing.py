@@ -0,0 +1,85 @@
+# frame_timing.py
+# Opt-in flip-to-flip interval recorder, tagged by experiment phase.
+#
+# The scripts call tick() right after every win.flip() and set_phase() when a phase
+# starts; intervals are only kept while a phase is set, and only between back-to-back
+# flips (gap() before a flip that follows idle polling). Wall and process CPU time are
+# accumulated per phase as well, so runs with and without STATIC_SCREENS can be compared
+# (cpu_pct = CPU load of the stimulus process, flips_per_s = GPU work proxy). At exit
+# write_summary() puts a per-phase table next to the event log.
+
+import csv, math, time
+
+
+def _percentile(sorted_xs, p):
+    # nearest-rank percentile on an already sorted list
+    if not sorted_xs: return float("nan")
+    k = max(0, min(len(sorted_xs) - 1, math.ceil(p / 100.0 * len(sorted_xs)) - 1))
+    return sorted_xs[k]
+
+
+class FrameTimer:
+    def __init__(self, frame_period):
+        self.frame_period = frame_period or (1.0 / 60)
+        self.phase = None
+        self.intervals = {}   # phase -> [seconds]
+        self.load = {}        # phase -> [wall_s, cpu_s, flips]
+        self._last = None
+        self._t0 = self._cpu0 = None
+
+    def set_phase(self, phase):
+        """Start tagging intervals with `phase` (None stops recording)."""
+        self._close_phase()
+        self.phase = phase
+        self._last = None     # a gap between phases is not a frame interval
+        self._t0, self._cpu0 = time.perf_counter(), time.process_time()
+
+    def _close_phase(self):
+        if self.phase is None or self._t0 is None: return
+        acc = self.load.setdefault(self.phase, [0.0, 0.0, 0])
+        acc[0] += time.perf_counter() - self._t0
+        acc[1] += time.process_time() - self._cpu0
+
+    def gap(self):
+        """The next flip follows idle polling (static screens), not the previous flip:
+        it starts a new run of intervals instead of counting the pause as one."""
+        self._last = None
+
+    def tick(self):
+        if self.phase is None: return
+        t = time.perf_counter()
+        self.load.setdefault(self.phase, [0.0, 0.0, 0])[2] += 1
+        if self._last is not None:
+            self.intervals.setdefault(self.phase, []).append(t - self._last)
+        self._last = t
+
+    def summary(self):
+        self.set_phase(self.phase)   # fold the running phase into the load totals
+        slow = 1.5 * self.frame_period
+        rows = []
+        for phase in sorted(set(self.intervals) | set(self.load)):
+            s = sorted(self.intervals.get(phase, []))
+            wall, cpu, flips = self.load.get(phase, [0.0, 0.0, 0])
+            rows.append({
+                "phase": phase, "count": len(s),
+                "mean_ms": 1000 * sum(s) / len(s) if s else float("nan"),
+                "p95_ms": 1000 * _percentile(s, 95), "p99_ms": 1000 * _percentile(s, 99),
+                "max_ms": 1000 * s[-1] if s else float("nan"),
+                "n_over_1.5x": sum(1 for x in s if x > slow),
+                "frame_period_ms": 1000 * self.frame_period,
+                "wall_s": wall, "cpu_s": cpu,
+                "cpu_pct": 100 * cpu / wall if wall else float("nan"),
+                "flips_per_s": flips / wall if wall else float("nan"),
+            })
+        return rows
+
+    def write_summary(self, path):
+        rows = self.summary()
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=["phase", "count", "mean_ms", "p95_ms", "p99_ms",
+                                              "max_ms", "n_over_1.5x", "frame_period_ms",
+                                              "wall_s", "cpu_s", "cpu_pct", "flips_per_s"])
+            w.writeheader()
+            for r in rows:
+                w.writerow({k: (f"{v:.3f}" if isinstance(v, float) else v) for k, v in r.items()})
+        return rows
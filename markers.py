@@ -0,0 +1,406 @@
+# markers.py
+# Marker transports shared by the run_enem_blocks scripts.
+#
+# A MarkerHub fans every marker out to a list of backends:
+#   lsl          LSL string marker stream (pylsl), pushed from a sender thread
+#   ttl          parallel-port TTL pulse (psychopy.parallel), driven from a pulser thread
+#   ttl_serial   serial/USB trigger box (pyserial): code byte, then 0 after the pulse width
+#   udp          "name,code,timestamp" datagrams to host:port
+#   udp_loopback udp to a receiver thread in this process (tests the stack without hardware)
+#   file         one "timestamp,name,code" line per marker
+# Transport modules are imported when a backend is opened, so a disabled transport
+# costs nothing at startup. A backend that fails to open is reported and left out;
+# the others keep working. Backend send() calls never wait on the device or network;
+# the hub times every call, and each backend reports its own summary for the log.
+# Statistics are kept in constant memory (running count/mean/max, and the last
+# KEEP_SAMPLES per-marker latencies for percentiles and the latency CSV), so a long
+# session does not grow them.
+#
+#   markers = open_markers(["lsl", "ttl"], clock=core.getTime, lsl_name="psychopy_markers")
+#   markers.send("Q_TEXT_ON", 11)
+
+import queue, socket, sys, threading, time
+from collections import OrderedDict, deque
+
+KEEP_SAMPLES = 10000   # per-marker latency rows kept (the most recent)
+
+
+def _sleep_until(t_target):
+    # coarse sleep, then spin the last ~1 ms for sub-ms pulse edges
+    while True:
+        left = t_target - time.perf_counter()
+        if left <= 0: return
+        if left > 0.0015: time.sleep(left - 0.001)
+
+
+def _raise_thread_priority(tag):
+    if sys.platform != "win32": return
+    try:
+        import ctypes
+        k32 = ctypes.windll.kernel32
+        k32.SetThreadPriority(k32.GetCurrentThread(), 15)  # THREAD_PRIORITY_TIME_CRITICAL
+    except Exception as e:
+        print(f"[{tag}] could not raise thread priority:", e)
+
+
+class RunningStats:
+    """Count, mean and max of a stream of values."""
+    __slots__ = ("n", "total", "max")
+
+    def __init__(self):
+        self.n, self.total, self.max = 0, 0.0, 0.0
+
+    def add(self, x):
+        self.n += 1; self.total += x
+        if x > self.max: self.max = x
+
+    @property
+    def mean(self):
+        return self.total / self.n if self.n else 0.0
+
+
+def _p95(values):
+    xs = sorted(values)
+    return xs[int(0.95 * (len(xs) - 1))]
+
+
+class MarkerBackend:
+    """send(name, code, ts) must return quickly; device/network work belongs on a thread."""
+    name = "base"
+
+    def __init__(self):
+        self.call_cost = RunningStats()   # seconds spent in send() on the caller's thread (set by the hub)
+        self.errors = queue.SimpleQueue()   # (marker name, timestamp, reason)
+
+    def send(self, name, code, ts):
+        raise NotImplementedError
+
+    def take_errors(self):
+        out = []
+        while True:
+            try: out.append(self.errors.get_nowait())
+            except queue.Empty: return out
+
+    def details(self):
+        return ""
+
+    def summary(self):
+        calls = self.call_cost
+        s = f"{self.name} calls={calls.n}"
+        if calls.n:
+            s += f" call_mean={1e6*calls.mean:.1f}us call_max={1e6*calls.max:.1f}us"
+        d = self.details()
+        return s + (" " + d if d else "")
+
+    def close(self, timeout=1.0):
+        pass
+
+
+# ===== LSL =====
+class LSLBackend(MarkerBackend):
+    """Pushes LSL markers from its own thread so a stalled network never blocks the frame loop.
+
+    send() enqueues without waiting; if the bounded queue is full the marker is dropped
+    and reported. Every marker keeps the timestamp taken at the call site.
+    """
+    name = "lsl"
+
+    def __init__(self, stream_name, stream_type, maxsize=256, source_id=None):
+        super().__init__()
+        from pylsl import StreamInfo, StreamOutlet
+        info = StreamInfo(stream_name, stream_type, 1, 0, 'string', source_id or f'psychopy_{int(time.time())}')
+        self.outlet = StreamOutlet(info)
+        self.q = queue.Queue(maxsize)
+        self.sent = deque(maxlen=KEEP_SAMPLES)   # (name, lsl timestamp, enqueue->push latency)
+        self.latency = RunningStats()
+        self.n_dropped = self.n_failed = 0
+        self.thread = threading.Thread(target=self._run, name="lsl-sender", daemon=True)
+        self.thread.start()
+        print("[LSL] Marker stream created.")
+
+    def send(self, name, code, ts):
+        try:
+            self.q.put_nowait((name, ts, time.perf_counter()))
+        except queue.Full:
+            self.n_dropped += 1; self.errors.put((name, ts, "dropped: send queue full"))
+
+    def _run(self):
+        while True:
+            item = self.q.get()
+            if item is None: break
+            name, ts, t_req = item
+            try:
+                self.outlet.push_sample([name], timestamp=ts)
+                lat = time.perf_counter() - t_req
+                self.sent.append((name, ts, lat)); self.latency.add(lat)
+            except Exception as e:
+                self.n_failed += 1; self.errors.put((name, ts, f"send error: {e}"))
+
+    def details(self):
+        lat = self.latency
+        s = f"sent={lat.n} dropped={self.n_dropped} failed={self.n_failed} queued={self.q.qsize()}"
+        if lat.n:
+            s += (f" lat_mean={1000*lat.mean:.3f}ms "
+                  f"lat_p95={1000*_p95(x[2] for x in list(self.sent)):.3f}ms lat_max={1000*lat.max:.3f}ms")
+        return s
+
+    def write_latencies(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("marker_name,lsl_timestamp,latency_ms\n")
+            for name, ts, lat in list(self.sent):
+                f.write(f"{name},{ts:.6f},{1000*lat:.3f}\n")
+
+    def close(self, timeout=1.0):
+        # a stalled outlet must not hang shutdown: give it timeout seconds to drain
+        try: self.q.put(None, timeout=timeout)
+        except queue.Full: pass
+        self.thread.join(timeout)
+
+
+# ===== TTL (parallel port / serial trigger box) =====
+class TTLPulser(MarkerBackend):
+    """Drives a TTL port from its own thread so a marker never blocks the frame loop.
+
+    send() only enqueues. The thread raises the lines, holds them `width` seconds and lowers
+    them; pulses are serialized with at least `min_gap` low in between, so back-to-back
+    markers (BUTTON_CLICK then Q_STEM_ON) queue up instead of merging into one pulse.
+    Codes <= 0 are not sent. `port` needs setData(code).
+    """
+    name = "ttl"
+
+    def __init__(self, port, width=0.005, min_gap=0.002):
+        super().__init__()
+        self.port, self.width, self.min_gap = port, width, min_gap
+        self.q = queue.Queue()
+        self.n = self.deferred = 0
+        self.start_lag, self.width_err = RunningStats(), RunningStats()   # width_err: |actual - width|
+        self.thread = threading.Thread(target=self._run, name=f"{self.name}-pulser", daemon=True)
+        self.thread.start()
+
+    def send(self, name, code, ts):
+        if code <= 0: return
+        if self.q.unfinished_tasks: self.deferred += 1   # previous pulse still up/queued
+        self.q.put((name, code, ts, time.perf_counter()))
+
+    def _run(self):
+        _raise_thread_priority("TTL")
+        last_low = 0.0
+        while True:
+            item = self.q.get()
+            if item is None: break
+            name, code, ts, t_req = item
+            try:
+                _sleep_until(last_low + self.min_gap)
+                t_up = time.perf_counter(); self.port.setData(code)
+                _sleep_until(t_up + self.width)
+                self.port.setData(0); last_low = time.perf_counter()
+                self.start_lag.add(t_up - t_req)
+                self.width_err.add(abs((last_low - t_up) - self.width))
+                self.n += 1
+            except Exception as e:
+                self.errors.put((name, ts, f"send error: {e}"))
+            self.q.task_done()
+
+    def details(self):
+        if not self.n: return "pulses=0"
+        return (f"pulses={self.n} deferred={self.deferred} "
+                f"lag_mean={1000*self.start_lag.mean:.3f}ms lag_max={1000*self.start_lag.max:.3f}ms "
+                f"width_jitter_max={1000*self.width_err.max:.3f}ms")
+
+    def close(self, timeout=1.0):
+        self.q.put(None); self.thread.join(timeout)
+        try: self.port.setData(0)
+        except Exception: pass
+
+
+class ParallelTTLBackend(TTLPulser):
+    name = "ttl"
+
+    def __init__(self, address, width=0.005, min_gap=0.002):
+        from psychopy import parallel
+        port = parallel.ParallelPort(address=address)
+        port.setData(0)
+        super().__init__(port, width, min_gap)
+        print("[TTL] Parallel port ready at", hex(address))
+
+
+class _SerialPort:
+    def __init__(self, ser): self.ser = ser
+    def setData(self, code): self.ser.write(bytes([code & 0xFF]))
+
+
+class SerialTTLBackend(TTLPulser):
+    name = "ttl_serial"
+
+    def __init__(self, port, baudrate=115200, width=0.005, min_gap=0.002):
+        import serial
+        self.ser = serial.Serial(port, baudrate=baudrate, timeout=0, write_timeout=0.05)
+        self.ser.write(b"\x00")
+        super().__init__(_SerialPort(self.ser), width, min_gap)
+        print(f"[TTL] Serial trigger box ready on {port}")
+
+    def close(self, timeout=1.0):
+        super().close(timeout)
+        try: self.ser.close()
+        except Exception: pass
+
+
+# ===== UDP / file =====
+class UDPBackend(MarkerBackend):
+    """Fire-and-forget datagrams "name,code,timestamp" (sendto on a non-blocking socket)."""
+    name = "udp"
+
+    def __init__(self, host="127.0.0.1", port=16571):
+        super().__init__()
+        self.addr = (host, int(port))
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.n = 0
+
+    def send(self, name, code, ts):
+        try:
+            self.sock.sendto(f"{name},{code},{ts:.6f}".encode("ascii"), self.addr); self.n += 1
+        except OSError as e:
+            self.errors.put((name, ts, f"send error: {e}"))
+
+    def details(self):
+        return f"sent={self.n} to={self.addr[0]}:{self.addr[1]}"
+
+    def close(self, timeout=1.0):
+        self.sock.close()
+
+
+class UDPLoopbackBackend(UDPBackend):
+    """UDP to a receiver thread in this process: exercises the whole marker path with no
+    hardware and reports what arrived, and how late, against what was sent."""
+    name = "udp_loopback"
+
+    def __init__(self):
+        self.rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.rx.bind(("127.0.0.1", 0)); self.rx.settimeout(0.1)
+        super().__init__("127.0.0.1", self.rx.getsockname()[1])
+        self.t_sent = OrderedDict()   # datagram -> perf_counter() at send; the oldest KEEP_SAMPLES
+        self.t_lock = threading.Lock()
+        self.n_lost = 0               # given up on (pushed out of t_sent before arriving)
+        self.received = deque(maxlen=KEEP_SAMPLES)   # (name, code, marker ts, send -> arrival seconds)
+        self.latency = RunningStats()
+        self._stop = False
+        self.thread = threading.Thread(target=self._run, name="udp-loopback", daemon=True)
+        self.thread.start()
+
+    def send(self, name, code, ts):
+        with self.t_lock:
+            self.t_sent[f"{name},{code},{ts:.6f}".encode("ascii")] = time.perf_counter()
+            while len(self.t_sent) > KEEP_SAMPLES:
+                self.t_sent.popitem(last=False); self.n_lost += 1
+        super().send(name, code, ts)
+
+    def _run(self):
+        while not self._stop:
+            try: data, _ = self.rx.recvfrom(512)
+            except socket.timeout: continue
+            except OSError: return
+            t = time.perf_counter()
+            with self.t_lock: t0 = self.t_sent.pop(data, None)
+            if t0 is None: continue   # already given up on (counted in n_lost)
+            name, code, ts = data.decode("ascii").rsplit(",", 2)
+            self.received.append((name, int(code), float(ts), t - t0)); self.latency.add(t - t0)
+
+    def details(self):
+        lat = self.latency
+        s = f"sent={self.n} received={lat.n} lost={self.n_lost}"
+        if lat.n: s += f" lat_mean={1000*lat.mean:.3f}ms lat_max={1000*lat.max:.3f}ms"
+        return s
+
+    def write_latencies(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("marker_name,marker_code,timestamp,latency_ms\n")
+            for name, code, ts, lat in list(self.received):
+                f.write(f"{name},{code},{ts:.6f},{1000*lat:.3f}\n")
+
+    def close(self, timeout=1.0):
+        time.sleep(0.05)   # let the last datagrams arrive
+        self._stop = True; self.thread.join(timeout)
+        super().close(timeout); self.rx.close()
+
+
+class FileBackend(MarkerBackend):
+    """Markers only to a local file (buffered; flushed at close)."""
+    name = "file"
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.f = open(path, "w", encoding="utf-8")
+        self.f.write("timestamp,marker_name,marker_code\n")
+        self.n = 0
+
+    def send(self, name, code, ts):
+        self.f.write(f"{ts:.6f},{name},{code}\n"); self.n += 1
+
+    def details(self):
+        return f"written={self.n} path={self.path}"
+
+    def close(self, timeout=1.0):
+        if not self.f.closed: self.f.close()
+
+
+# ===== hub =====
+class MarkerHub:
+    def __init__(self, backends, clock=time.perf_counter):
+        self.backends = list(backends)
+        self.clock = clock
+        self.failed = []   # (backend name, error) for backends that could not be opened
+
+    def __bool__(self):
+        return bool(self.backends)
+
+    def send(self, name, code):
+        """Fan out to every backend; all get the same timestamp, taken here."""
+        if not self.backends: return None
+        ts = self.clock()
+        for b in self.backends:
+            c0 = time.perf_counter()
+            try:
+                b.send(name, code, ts)
+            except Exception as e:
+                b.errors.put((name, ts, f"send error: {e}"))
+            b.call_cost.add(time.perf_counter() - c0)
+        return ts
+
+    def write_latencies(self, prefix):
+        for b in self.backends:
+            if hasattr(b, "write_latencies"):
+                try: b.write_latencies(f"{prefix}_{b.name}.csv")
+                except Exception as e: print(f"[MARKERS] could not write {b.name} latencies:", e)
+
+    def close(self, timeout=1.0):
+        for b in self.backends:
+            try: b.close(timeout)
+            except Exception as e: print(f"[MARKERS] {b.name} close error:", e)
+
+
+def open_markers(kinds, clock=time.perf_counter, lsl_name="psychopy_markers", lsl_type="Markers",
+                 lsl_queue=256, parallel_addr=0x0378, serial_port="COM3", serial_baud=115200,
+                 ttl_width=0.005, ttl_min_gap=0.002, udp_host="127.0.0.1", udp_port=16571,
+                 file_path=None, lsl_source_id=None):
+    """MarkerHub over the backends named in kinds (see module header)."""
+    factories = {
+        "lsl": lambda: LSLBackend(lsl_name, lsl_type, lsl_queue, lsl_source_id),
+        "ttl": lambda: ParallelTTLBackend(parallel_addr, ttl_width, ttl_min_gap),
+        "ttl_serial": lambda: SerialTTLBackend(serial_port, serial_baud, ttl_width, ttl_min_gap),
+        "udp": lambda: UDPBackend(udp_host, udp_port),
+        "udp_loopback": lambda: UDPLoopbackBackend(),
+        "file": lambda: FileBackend(file_path or f"markers_{time.strftime('%Y%m%d_%H%M%S')}.csv"),
+    }
+    backends, failed = [], []
+    for kind in kinds:
+        if kind not in factories:
+            print(f"[MARKERS] unknown backend {kind!r}"); failed.append((kind, "unknown backend")); continue
+        try:
+            backends.append(factories[kind]())
+        except Exception as e:
+            print(f"[MARKERS] {kind} ERROR:", e); failed.append((kind, str(e)))
+    hub = MarkerHub(backends, clock)
+    hub.failed = failed
+    return hub
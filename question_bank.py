@@ -0,0 +1,139 @@
+# question_bank.py
+# Compiled, indexed store for the ENEM question JSON (filtered_questions.json /
+# questions_with_time.json).
+#
+# compile_bank() turns the JSON list into an SQLite file next to it, keyed by
+# (year, color, question_number) with secondary indexes on type, field and time.
+# It only rebuilds when the SHA-256 of the source JSON changes, so a session start
+# opens the store and pulls just the rows it needs instead of parsing the whole bank.
+#
+#   python question_bank.py questions_with_time.json      # compile / check up to date
+
+import hashlib, json, os, sqlite3, sys
+
+STORE_VERSION = "1"
+META_COLS = ("year", "color", "question_number", "type", "field", "time")
+
+
+def default_store_path(json_path):
+    return os.path.splitext(json_path)[0] + ".bank.sqlite"
+
+
+def source_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _stored_meta(store_path):
+    try:
+        con = sqlite3.connect(store_path)
+        try:
+            return dict(con.execute("SELECT key, value FROM meta"))
+        finally:
+            con.close()
+    except sqlite3.Error:
+        return {}
+
+
+def compile_bank(json_path, store_path=None, force=False):
+    """Build the store for json_path unless it is already up to date.
+    Returns (store_path, rebuilt)."""
+    store_path = store_path or default_store_path(json_path)
+    digest = source_hash(json_path)
+    if not force and os.path.exists(store_path):
+        meta = _stored_meta(store_path)
+        if meta.get("source_sha256") == digest and meta.get("store_version") == STORE_VERSION:
+            return store_path, False
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+
+    tmp_path = store_path + ".tmp"
+    if os.path.exists(tmp_path): os.remove(tmp_path)
+    con = sqlite3.connect(tmp_path)
+    try:
+        con.executescript("""
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE items (
+                year TEXT, color TEXT, question_number INTEGER,
+                type TEXT, field TEXT, time REAL, payload TEXT,
+                PRIMARY KEY (year, color, question_number)
+            );
+        """)
+        con.executemany(
+            "INSERT OR REPLACE INTO items VALUES (?,?,?,?,?,?,?)",
+            [(str(q.get("year", "")), q.get("color", ""), q.get("question_number"),
+              q.get("type"), q.get("field"), q.get("time"),
+              json.dumps(q, ensure_ascii=False)) for q in items]
+        )
+        con.executescript("""
+            CREATE INDEX idx_type ON items(type);
+            CREATE INDEX idx_field ON items(field);
+            CREATE INDEX idx_time ON items(time);
+        """)
+        con.executemany("INSERT INTO meta VALUES (?,?)", [
+            ("source_sha256", digest), ("store_version", STORE_VERSION),
+            ("source_path", os.path.abspath(json_path)), ("n_items", str(len(items))),
+        ])
+        con.commit()
+    finally:
+        con.close()
+    os.replace(tmp_path, store_path)   # readers never see a half-built store
+    return store_path, True
+
+
+class QuestionBank:
+    """Read side of the compiled store. Metadata queries never touch the text payload."""
+
+    def __init__(self, store_path):
+        self.path = store_path
+        self.con = sqlite3.connect(store_path)
+
+    @classmethod
+    def from_json(cls, json_path, store_path=None):
+        store_path, rebuilt = compile_bank(json_path, store_path)
+        if rebuilt: print(f"[BANK] Compiled {json_path} -> {store_path}")
+        return cls(store_path)
+
+    def index(self, type=None, field=None, max_time=None):
+        """Metadata rows (dicts of META_COLS) matching the filters, in key order."""
+        where, args = [], []
+        if type is not None: where.append("type = ?"); args.append(type)
+        if field is not None: where.append("field = ?"); args.append(field)
+        if max_time is not None: where.append("time <= ?"); args.append(max_time)
+        sql = f"SELECT {', '.join(META_COLS)} FROM items"
+        if where: sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY year, color, question_number"
+        return [dict(zip(META_COLS, row)) for row in self.con.execute(sql, args)]
+
+    def get(self, key):
+        row = self.con.execute(
+            "SELECT payload FROM items WHERE year = ? AND color = ? AND question_number = ?",
+            (str(key[0]), key[1], key[2])).fetchone()
+        if row is None: raise KeyError(key)
+        return json.loads(row[0])
+
+    def get_many(self, keys):
+        """Full question dicts for keys (tuples or metadata dicts), in the given order."""
+        return [self.get(_as_key(k)) for k in keys]
+
+    def close(self):
+        self.con.close()
+
+
+def _as_key(k):
+    if isinstance(k, dict): return (k["year"], k["color"], k["question_number"])
+    return tuple(k)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python question_bank.py <questions.json> [--force]"); sys.exit(2)
+    path, rebuilt = compile_bank(sys.argv[1], force="--force" in sys.argv[2:])
+    bank = QuestionBank(path)
+    n = len(bank.index())
+    print(f"[BANK] {path}: {n} items ({'rebuilt' if rebuilt else 'up to date'})")
+    bank.close()
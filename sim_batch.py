@@ -0,0 +1,236 @@
+# sim_batch.py
+# Batch simulator for choosing the block design (blocks.questions_per_block,
+# blocks.duration_secs, ITI range of configs/v3.json) before running participants.
+#
+# Every simulated session is a real run of run_enem_blocks_3.py in --simulate mode
+# (same enem_engine block builder, trial and block code; sim_psychopy in place of PsychoPy),
+# executed in-process by a pool worker, so there is no interpreter start-up per
+# session. Sessions are independent, so throughput scales with the number of worker
+# processes. The virtual participants use RT models fitted to the recorded logs.
+#
+# Per design it reports the block-overrun rate (blocks that ran past their budget),
+# the idle rest time at the end of blocks and the distribution of trials completed
+# per block. Each session logs (and keeps its line-breaking cache) in its own temp
+# directory, removed after the session.
+#
+#   python sim_batch.py --per-block 2,3,4 --block-secs 360,420 --iti 3-5,2-4 -n 200
+#   python sim_batch.py --fit-only                  # just print the fitted RT model
+
+import argparse, contextlib, csv, glob, io, itertools, json, math, multiprocessing
+import os, re, runpy, shutil, statistics, sys, tempfile, time
+
+from question_bank import QuestionBank
+from sim_psychopy import DEFAULT_RT_MODEL
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(BASE_DIR, "run_enem_blocks_3.py")
+QUESTIONS_JSON = os.path.join(BASE_DIR, "questions_with_time.json")
+MIN_SAMPLES = 3
+MIN_SIGMA_SAMPLES = 20   # fewer samples keep the default spread (a few pilot logs give sigma > 1)
+SIGMA_RANGE = (0.1, 1.0)
+OVERRUN_TOLERANCE_SECS = 1.0
+SIM_POLL_SECS = 0.02   # coarser idle polling than on the lab PC; ~10x faster sessions
+
+
+# ===== RT model from recorded logs =====
+def _durations(rows):
+    """(kind, seconds, question key) samples from one log's rows (v2 and v3 phase names)."""
+    out = []
+    open_t = {}
+    for r in rows:
+        try: t = float(r["t_abs"])
+        except (KeyError, ValueError): continue
+        phase = r.get("phase", "")
+        key = (r.get("question_year", ""), r.get("question_number", ""))
+        if phase in ("q_text_on", "question_text") and "reading" not in open_t:
+            open_t["reading"] = t
+        elif phase in ("q_stem_on", "question_full") and "reading" in open_t:
+            out.append(("reading", t - open_t.pop("reading"), key))
+            if phase == "q_stem_on": open_t["stem"] = t
+        elif phase == "q_options_on" and "stem" in open_t:
+            out.append(("stem", t - open_t.pop("stem"), key))
+        elif phase == "answer" and r.get("rt_from_phase"):
+            out.append(("answer", float(r["rt_from_phase"]), key))
+            open_t.clear()
+        elif phase == "questionnaire_item" and r.get("rt_from_phase"):
+            kind = "qnr_choice" if "choice" in r.get("note", "") else "qnr_text"
+            out.append((kind, float(r["rt_from_phase"]), key))
+    return out
+
+
+def fit_rt_model(log_paths, bank=None):
+    """Lognormal (base, per_char, sigma) per screen kind; kinds with fewer than
+    MIN_SAMPLES samples keep the sim_psychopy defaults, and fewer than
+    MIN_SIGMA_SAMPLES keep the default sigma. sigma is clamped to SIGMA_RANGE."""
+    text_len = {}
+    if bank is not None:
+        for meta in bank.index():
+            q = bank.get((meta["year"], meta["color"], meta["question_number"]))
+            text_len[(str(meta["year"]), str(meta["question_number"]))] = (
+                len(q.get("question_text_translated", "")), len(q.get("question_itself_translated", "")))
+    samples = {}
+    for path in log_paths:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for kind, secs, key in _durations(csv.DictReader(f)):
+                if secs > 0: samples.setdefault(kind, []).append((secs, key))
+
+    model, counts = dict(DEFAULT_RT_MODEL), {}
+    for kind, xs in samples.items():
+        counts[kind] = len(xs)
+        if len(xs) < MIN_SAMPLES: continue
+        chars = [text_len.get(key, (0, 0))[1 if kind == "stem" else 0] if kind in ("reading", "stem") else 0
+                 for _, key in xs]
+        if all(chars):
+            per_char = statistics.median(s / c for (s, _), c in zip(xs, chars))
+            pred = [per_char * c for c in chars]
+            base = 0.0
+        else:
+            base, per_char = statistics.median(s for s, _ in xs), 0.0
+            pred = [base] * len(xs)
+        if len(xs) >= MIN_SIGMA_SAMPLES:
+            sigma = statistics.pstdev(math.log(s / p) for (s, _), p in zip(xs, pred))
+        else:
+            sigma = DEFAULT_RT_MODEL.get(kind, (0, 0, 0.4))[2]
+        sigma = min(max(sigma, SIGMA_RANGE[0]), SIGMA_RANGE[1])
+        model[kind] = (round(base, 4), round(per_char, 5), round(sigma, 4))
+    return model, counts
+
+
+# ===== one session =====
+def _parse_session(path):
+    blocks, cur = [], None
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for r in csv.DictReader(f):
+            phase, note = r["phase"], r["note"]
+            if phase == "block_start":
+                m = re.search(r"target ([\d.]+)s", note)
+                cur = {"target": float(m.group(1)) if m else None, "trials": 0, "rest": 0.0}
+            elif cur is None:
+                continue
+            elif phase == "answer":
+                cur["trials"] += 1
+            elif phase == "block_rest_wait":
+                m = re.search(r"Waiting ([\d.]+)s", note)
+                if m: cur["rest"] = float(m.group(1))
+            elif phase == "block_end":
+                m = re.search(r"actual ([\d.]+)s", note)
+                cur["actual"] = float(m.group(1)) if m else None
+                blocks.append(cur); cur = None
+    return blocks
+
+
+def run_session(job):
+    """Runs one simulated session in this process; returns its per-block results."""
+    design, seed, rt_script = job
+    import sim_psychopy
+    sim_psychopy.reset_clock()
+    log_dir = tempfile.mkdtemp(prefix="enem_sim_")
+    argv = sys.argv
+    sys.argv = [SCRIPT, "--simulate", "--sim-seed", str(seed), "--sim-id", f"sim{seed}",
+                "--sim-log-dir", log_dir, "--sim-config", json.dumps(design)]
+    if rt_script: sys.argv += ["--sim-script", rt_script]
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            runpy.run_path(SCRIPT, run_name="__main__")
+    except SystemExit:
+        pass
+    finally:
+        sys.argv = argv
+    try:
+        logs = [p for p in glob.glob(os.path.join(log_dir, "*.csv")) if not p.endswith("_frames.csv")]
+        return _parse_session(logs[0]) if logs else []
+    finally:
+        shutil.rmtree(log_dir, ignore_errors=True)
+
+
+# ===== designs =====
+def _design_grid(args):
+    grid = []
+    for per_block, secs, iti in itertools.product(args.per_block, args.block_secs, args.iti):
+        lo, hi = iti
+        # dotted config overrides (enem_engine/config.py)
+        grid.append({"blocks.questions_per_block": per_block, "blocks.duration_secs": secs,
+                     "trial.iti_min_secs": lo, "trial.iti_max_secs": hi,
+                     "display.static_poll_secs": SIM_POLL_SECS})
+    return grid
+
+
+def summarize(design, sessions):
+    blocks = [b for s in sessions for b in s]
+    n = len(blocks)
+    over = [b for b in blocks if b.get("actual") is not None and b["target"] is not None
+            and b["actual"] > b["target"] + OVERRUN_TOLERANCE_SECS]
+    rests = [b["rest"] for b in blocks]
+    hist = {}
+    for b in blocks: hist[b["trials"]] = hist.get(b["trials"], 0) + 1
+    return {
+        "design": design, "sessions": len(sessions), "blocks": n,
+        "overrun_rate": len(over) / n if n else 0.0,
+        "overrun_mean_s": statistics.mean(b["actual"] - b["target"] for b in over) if over else 0.0,
+        "rest_mean_s": statistics.mean(rests) if rests else 0.0,
+        "rest_p95_s": sorted(rests)[int(0.95 * (n - 1))] if rests else 0.0,
+        "trials_per_block": {str(k): hist[k] / n for k in sorted(hist)},
+    }
+
+
+def _int_list(s): return [int(x) for x in s.split(",")]
+def _float_list(s): return [float(x) for x in s.split(",")]
+def _range_list(s): return [tuple(float(v) for v in x.split("-")) for x in s.split(",")]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Simulate many sessions per block design.")
+    ap.add_argument("--per-block", type=_int_list, default=[3], help="questions per block, e.g. 2,3,4")
+    ap.add_argument("--block-secs", type=_float_list, default=[420.0], help="block durations in seconds")
+    ap.add_argument("--iti", type=_range_list, default=[(3.0, 5.0)], help="ITI ranges, e.g. 3-5,2-4")
+    ap.add_argument("-n", "--sessions", type=int, default=100, help="sessions per design")
+    ap.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--logs", default=os.path.join(BASE_DIR, "logs", "*.csv"), help="logs to fit RTs on")
+    ap.add_argument("--fit-only", action="store_true")
+    ap.add_argument("-o", "--out", default=None, help="write the summary as JSON")
+    args = ap.parse_args()
+
+    bank = QuestionBank.from_json(QUESTIONS_JSON)
+    model, counts = fit_rt_model(sorted(glob.glob(args.logs)), bank)
+    bank.close()
+    print("[FIT] samples:", ", ".join(f"{k}={v}" for k, v in sorted(counts.items())) or "none")
+    for kind, (base, per_char, sigma) in sorted(model.items()):
+        print(f"[FIT] {kind:<10} base={base:.2f}s per_char={per_char * 1000:.1f}ms sigma={sigma:.2f}")
+    if args.fit_only: return
+
+    fd, rt_script = tempfile.mkstemp(prefix="enem_rt_", suffix=".json")
+    with os.fdopen(fd, "w") as f:
+        json.dump({"rt_model": model}, f)
+
+    designs = _design_grid(args)
+    jobs = [(d, args.seed + i, rt_script) for d in designs for i in range(args.sessions)]
+    t0 = time.perf_counter()
+    results = {i: [] for i in range(len(designs))}
+    try:
+        with multiprocessing.Pool(args.jobs) as pool:
+            for k, blocks in enumerate(pool.imap(run_session, jobs, chunksize=4)):
+                results[k // args.sessions].append(blocks)
+    finally:
+        os.remove(rt_script)
+    secs = time.perf_counter() - t0
+    print(f"[SIM] {len(jobs)} sessions in {secs:.1f}s on {args.jobs} processes "
+          f"({len(jobs) / secs:.1f} sessions/s)")
+
+    summary = [summarize(designs[i], results[i]) for i in range(len(designs))]
+    print(f"{'per_block':>9} {'block_s':>7} {'iti':>7} {'overrun':>8} {'over_s':>7} {'rest_s':>7} "
+          f"{'rest_p95':>8}  trials/block")
+    for s in summary:
+        d = s["design"]
+        hist = " ".join(f"{k}:{v:.0%}" for k, v in s["trials_per_block"].items())
+        print(f"{d['blocks.questions_per_block']:>9} {d['blocks.duration_secs']:>7.0f} "
+              f"{d['trial.iti_min_secs']:>3.0f}-{d['trial.iti_max_secs']:<3.0f} {s['overrun_rate']:>8.1%} "
+              f"{s['overrun_mean_s']:>7.1f} {s['rest_mean_s']:>7.1f} {s['rest_p95_s']:>8.1f}  {hist}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"fitted_rt_model": model, "samples": counts, "results": summary}, f, indent=1)
+        print(f"[SIM] summary -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+# sim_psychopy.py
+# Headless stand-ins for the parts of PsychoPy the experiment scripts use, driven by
+# a virtual clock and a virtual participant. `python run_enem_blocks_3.py --simulate`
+# imports these instead of psychopy, so a full session (dialog, questionnaire, all
+# blocks, every log_event row and marker) runs in seconds with no display, and the
+# CSV it writes has exactly the format of a real run.
+#
+# Time: core.getTime()/Clock/MonotonicClock read a virtual clock. core.wait(s) and
+# every Window.flip() (one frame period) advance it, so ITIs, 7-minute blocks and rests
+# cost no real time.
+#
+# Participant: on every flip the window shows the participant what was drawn. When the
+# screen changes, the participant classifies it (message / reading / stem / answer /
+# questionnaire) and schedules key presses at now + RT, drawn from per-screen lognormal
+# RT models (or fixed RTs and answers from a script file). Responses are keyboard only.
+
+import json, math, random, sys
+
+# ===== virtual clock =====
+_now = [0.0]
+
+
+class _Core:
+    @staticmethod
+    def getTime():
+        return _now[0]
+
+    @staticmethod
+    def wait(secs, hogCPUperiod=0):
+        if secs > 0: _now[0] += secs
+
+    @staticmethod
+    def quit():
+        sys.exit(0)
+
+    class Clock:
+        def __init__(self):
+            self._t0 = _now[0]
+
+        def getTime(self):
+            return _now[0] - self._t0
+
+        def reset(self, newT=0.0):
+            self._t0 = _now[0] + newT
+
+    class MonotonicClock(Clock):
+        def getLastResetTime(self):
+            return self._t0
+
+
+core = _Core
+
+
+def reset_clock():
+    """Back to t=0 (the batch simulator runs many sessions in one process)."""
+    _now[0] = 0.0
+
+
+# ===== prefs / logging / gui =====
+class _Prefs:
+    general = {}
+    hardware = {}
+
+
+prefs = _Prefs
+
+
+class _Logging:
+    ERROR, WARNING, INFO, DEBUG = 40, 30, 20, 10
+
+    class console:
+        @staticmethod
+        def setLevel(level): pass
+
+
+logging = _Logging
+
+
+class _Gui:
+    participant_id = "sim"
+
+    class DlgFromDict:
+        def __init__(self, dictionary, title="", **kwargs):
+            if not dictionary.get("participant"):
+                dictionary["participant"] = _Gui.participant_id
+            self.OK = True
+
+
+gui = _Gui
+
+
+# ===== visual =====
+class _Backend:
+    def dispatchEvents(self): pass
+
+
+class Window:
+    def __init__(self, size=(1920, 1080), fullscr=False, units="pix", **kwargs):
+        self.size = list(size)
+        self.units = units
+        self.monitorFramePeriod = 1.0 / 60
+        self.recordFrameIntervals = False
+        self.backend = _Backend()
+        self._drawn = []
+        self._to_call = []
+        self.participant = None
+
+    def callOnFlip(self, function, *args, **kwargs):
+        self._to_call.append((function, args, kwargs))
+
+    def clearBuffer(self, color=True, depth=False, stencil=False):
+        self._drawn = []
+
+    def flip(self, clearBuffer=True):
+        frame = self._drawn
+        _now[0] += self.monitorFramePeriod
+        calls, self._to_call = self._to_call, []
+        for fn, args, kwargs in calls: fn(*args, **kwargs)
+        if self.participant is not None: self.participant.see(frame)
+        if clearBuffer: self._drawn = []
+        return _now[0]
+
+    def close(self): pass
+
+
+class _Stim:
+    def __init__(self, win, **kwargs):
+        self.win = win
+        self.pos = kwargs.get("pos", (0, 0))
+        for k, v in kwargs.items(): setattr(self, k, v)
+
+    def draw(self, win=None):
+        self.win._drawn.append(self)
+
+    def contains(self, x, y=None):
+        return False   # the virtual participant answers with the keyboard
+
+
+class TextStim(_Stim):
+    def __init__(self, win, text="", **kwargs):
+        super().__init__(win, **kwargs)
+        self.text = text
+
+
+class Rect(_Stim):
+    pass
+
+
+class _Visual:
+    Window, TextStim, Rect = Window, TextStim, Rect
+
+
+visual = _Visual
+
+
+# ===== input =====
+class KeyPress:
+    def __init__(self, name, t_down, duration=0.08):
+        self.name, self.tDown, self.duration = name, t_down, duration
+        self.rt = t_down
+
+    def __repr__(self):
+        return f"KeyPress({self.name!r}, {self.tDown:.3f})"
+
+
+class Keyboard:
+    instance = None
+
+    def __init__(self, *args, **kwargs):
+        self._events = []     # scheduled by the participant, sorted by tDown
+        Keyboard.instance = self
+
+    def press(self, name, t_down):
+        self._events.append(KeyPress(name, t_down))
+        self._events.sort(key=lambda k: k.tDown)
+
+    def pending(self):
+        return bool(self._events)
+
+    def getKeys(self, keyList=None, waitRelease=True, clear=True):
+        now = _now[0]
+        out = []
+        for k in self._events:
+            t_ready = k.tDown + (k.duration if waitRelease else 0.0)
+            if t_ready <= now and (keyList is None or k.name in keyList): out.append(k)
+        if clear:
+            for k in out: self._events.remove(k)
+        return out
+
+    def clearEvents(self, eventType=None):
+        # only presses that already happened; future ones have not been "typed" yet
+        self._events = [k for k in self._events if k.tDown > _now[0]]
+
+
+class _Keyboard:
+    Keyboard = Keyboard
+
+
+keyboard = _Keyboard
+
+
+class Mouse:
+    def __init__(self, win=None, **kwargs):
+        self.win = win
+
+    def getPressed(self, getTime=False):
+        return [False, False, False]
+
+    def isPressedIn(self, shape, buttons=(0, 1, 2)):
+        return False
+
+    def clickReset(self, buttons=(0, 1, 2)): pass
+
+    def getPos(self):
+        return (0.0, 0.0)
+
+
+class _Event:
+    Mouse = Mouse
+
+    @staticmethod
+    def clearEvents(eventType=None): pass
+
+
+event = _Event
+
+
+# ===== virtual participant =====
+DEFAULT_RT_MODEL = {
+    # screen kind -> (base seconds, seconds per character of the main text, lognormal sigma)
+    "message": (0.8, 0.0, 0.3),
+    "reading": (3.0, 0.05, 0.35),      # ~20 characters/s
+    "stem": (2.0, 0.05, 0.35),
+    "answer": (6.0, 0.01, 0.45),
+    "qnr_text": (2.0, 0.0, 0.4),
+    "qnr_choice": (1.5, 0.0, 0.4),
+}
+
+
+class VirtualParticipant:
+    """Watches each flipped frame and presses keys on the simulated keyboard."""
+
+    def __init__(self, kb, rng=None, rt_model=None, script=None):
+        self.kb = kb
+        self.rng = rng or random.Random()
+        self.rt_model = dict(DEFAULT_RT_MODEL, **(rt_model or {}))
+        self.script = script or {}
+        self.answers = list(self.script.get("answers", []))
+        self.last_signature = None
+        self.last_texts = set()
+
+    def rt(self, kind, n_chars=0):
+        fixed = self.script.get("rt", {}).get(kind)
+        if fixed is not None: return float(fixed)
+        base, per_char, sigma = self.rt_model[kind]
+        median = base + per_char * n_chars
+        return median * math.exp(self.rng.gauss(0.0, sigma))
+
+    def see(self, frame):
+        texts = [s.text for s in frame if isinstance(s, TextStim) and s.text]
+        signature = tuple(texts)
+        if signature == self.last_signature or self.kb.pending(): return
+        self.last_signature = signature
+        # reading time scales with the text that is new on this screen
+        n_new = sum(len(t) for t in texts if t not in self.last_texts)
+        self.last_texts = set(texts)
+        now = _now[0]
+        if any(t.startswith("A) ") for t in texts):
+            letter = self.answers.pop(0) if self.answers else self.rng.choice("ABCDE")
+            self.kb.press(letter.lower(), now + self.rt("answer", n_new))
+        elif "Show question" in texts:
+            self.kb.press("space", now + self.rt("reading", n_new))
+        elif "Show options" in texts:
+            self.kb.press("space", now + self.rt("stem", n_new))
+        elif any("(Type your answer" in t for t in texts):
+            t = now + self.rt("qnr_text")
+            for ch in "sim":
+                self.kb.press(ch, t); t += 0.15
+            self.kb.press("return", t)
+        elif any(t.startswith("1) ") for t in texts):
+            n = sum(1 for t in texts if t[:1].isdigit() and t[1:3] == ") ")
+            self.kb.press(str(self.rng.randint(1, max(1, n))), now + self.rt("qnr_choice"))
+        elif any("Press SPACE" in t for t in texts):
+            self.kb.press("space", now + self.rt("message"))
+
+
+def install_participant(win, kb, seed=None, script_path=None):
+    """Attach a virtual participant to win. script_path: optional JSON with fixed
+    {"rt": {kind: seconds}, "rt_model": {kind: [base, per_char, sigma]}, "answers": ["A", ...]}."""
+    script = None
+    if script_path:
+        with open(script_path, "r", encoding="utf-8") as f:
+            script = json.load(f)
+    rt_model = {k: tuple(v) for k, v in (script or {}).get("rt_model", {}).items()}
+    win.participant = VirtualParticipant(kb, random.Random(seed), rt_model, script)
+    return win.participant
@@ -0,0 +1,259 @@
+# trial_metrics.py
+# Per-trial derived metrics for many sessions at once, computed with NumPy array operations.
+#
+# All event rows of all sessions are loaded into one set of columns (the .evlog copy
+# when there is one, else the CSV) and pivoted with array operations, without a Python
+# loop over rows:
+#   reading_s  text phase onset -> button click   (Q_TEXT_ON / question_text)
+#   stem_s     stem phase onset -> button click   (Q_STEM_ON / v1 stem)
+#   options_s  options onset -> answer            (Q_OPTIONS_ON / question_full / v1 options)
+# A phase ends at the logged button_click_time of the next phase when there is one,
+# otherwise at the next phase onset. Time is summed over revisits (back_to_text).
+# Reading rates are words/s of question_text_translated over reading_s and of
+# question_itself_translated over stem_s (v1 CSV items: the stem). correct_key
+# scores the choice against the answer key: the questions file's "correct" field, or
+# --key with question_id,correct (question_id is <year>_<number> for the ENEM bank);
+# without a key the logged "correct" is used.
+#
+# derive() returns a dict of equal-length NumPy columns; pandas.DataFrame(trials)
+# turns it into a frame if that is more convenient.
+#
+#   python trial_metrics.py --questions questions_with_time.json -o logs/aggregate/metrics.csv
+#   python trial_metrics.py --logs D:/fnirs/logs --key answer_key.csv
+
+import argparse, csv, json, os, time
+
+import numpy as np
+
+from aggregate_logs import BASE_DIR, LOG_NAME, PHASES, detect_schema, session_logs
+
+KINDS = ("reading", "stem", "options")
+EVENT_COLUMNS = ("t_abs", "phase", "block", "trial_idx_in_block", "question_id", "question_number",
+                 "question_year", "question_type", "question_field", "rt_from_phase", "choice",
+                 "correct", "button_click_time")
+NUMERIC = ("t_abs", "trial_idx_in_block", "rt_from_phase", "button_click_time")
+METRIC_COLUMNS = [
+    "participant", "session_file", "protocol", "block", "trial", "question_id", "question_type",
+    "question_field", "iti_s", "reading_s", "stem_s", "options_s", "total_s", "revisits", "rt_s",
+    "choice", "correct_key", "reading_wps", "stem_wps",
+]
+
+
+# ===== loading =====
+def _columns(path):
+    """(header, {column: list}) of one session, from the columnar copy when there is one."""
+    evlog = path[:-4] + ".evlog"
+    if os.path.exists(evlog) and os.path.getmtime(evlog) >= os.path.getmtime(path) - 5:
+        try:
+            from columnar_log import read_columns
+            schema, cols = read_columns(evlog)
+            return [c["name"] for c in schema["columns"]], cols
+        except Exception as e:
+            print(f"[METRICS] {os.path.basename(evlog)} unreadable ({e}); using the CSV")
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        rows = list(reader)
+    width = len(header)
+    cols = list(zip(*(r[:width] + [""] * (width - len(r)) for r in rows))) or [()] * width
+    return header, dict(zip(header, map(list, cols)))
+
+
+def _num(values):
+    """float64 array from floats/ints or CSV text ("" and "None" -> NaN)."""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        pass
+    a = np.asarray([v if isinstance(v, str) else repr(v) for v in values], dtype=str)
+    a[(a == "") | (a == "None")] = "nan"
+    try:
+        return a.astype(np.float64)
+    except ValueError:
+        out = np.full(len(a), np.nan)
+        for i, s in enumerate(a):
+            try: out[i] = float(s)
+            except ValueError: pass
+        return out
+
+
+def load_events(paths):
+    """All event rows of the session logs in `paths` as one dict of arrays; "session"
+    indexes into the returned sessions list of (participant, file name)."""
+    data = {c: [] for c in EVENT_COLUMNS}
+    sizes, sessions = [], []
+    for path in paths:
+        header, cols = _columns(path)
+        if detect_schema(header) is None: continue
+        n = len(cols.get("t_abs", ()))
+        for c in EVENT_COLUMNS:
+            data[c].extend(cols[c] if c in cols else [""] * n)
+        m = LOG_NAME.match(os.path.basename(path))
+        sessions.append((m.group("participant") if m else "", os.path.basename(path)))
+        sizes.append(n)
+    ev = {c: _num(v) if c in NUMERIC else np.asarray(v, dtype=str) for c, v in data.items()}
+    ev["session"] = np.repeat(np.arange(len(sizes)), sizes)
+    return ev, sessions
+
+
+# ===== pivot =====
+def derive(ev, sessions):
+    """Per-trial columns (see METRIC_COLUMNS, minus the answer key/word-rate columns)."""
+    trial = ev["trial_idx_in_block"]
+    sel = (trial >= 0) & np.isfinite(ev["t_abs"])
+    ev = {c: v[sel] for c, v in ev.items()}
+    t, trial = ev["t_abs"], ev["trial_idx_in_block"].astype(np.int64)
+
+    # trial id per row, numbered in order of first appearance
+    blocks, bcode = np.unique(ev["block"], return_inverse=True)
+    key = (ev["session"].astype(np.int64) * max(1, len(blocks)) + bcode) * (int(trial.max(initial=0)) + 1) + trial
+    _, first, tid = np.unique(key, return_index=True, return_inverse=True)
+    order = np.argsort(first, kind="stable")
+    rank = np.empty_like(order); rank[order] = np.arange(len(order))
+    tid, first, n = rank[tid.ravel()], first[order], len(order)
+
+    names, pcode = np.unique(ev["phase"], return_inverse=True)
+    kind_of = np.array([KINDS.index(PHASES[p][1]) if p in PHASES else -1 for p in names], dtype=np.int64)
+    proto_of = np.array([PHASES[p][0] if p in PHASES else "" for p in names], dtype=str)
+    kind = kind_of[pcode] if len(names) else np.empty(0, dtype=np.int64)
+    phase = ev["phase"]
+    is_ans, is_back = phase == "answer", phase == "back_to_text"
+
+    # phase durations: each onset lasts until the next boundary row of the same trial
+    b = np.flatnonzero((kind >= 0) | is_ans | is_back)
+    b = b[np.lexsort((t[b], tid[b]))]
+    cur, nxt = b[:-1], b[1:]
+    ok = (tid[cur] == tid[nxt]) & (kind[cur] >= 0)
+    cur, nxt = cur[ok], nxt[ok]
+    end = t[nxt]
+    click = ev["button_click_time"][nxt]
+    use_click = (kind[nxt] >= 0) & np.isfinite(click) & (click >= t[cur]) & (click <= end)
+    end = np.where(use_click, click, end)
+    durs = np.zeros((len(KINDS), n))
+    seen = np.zeros((len(KINDS), n), dtype=bool)
+    np.add.at(durs, (kind[cur], tid[cur]), end - t[cur])
+    seen[kind[cur], tid[cur]] = True
+    durs[~seen] = np.nan
+
+    on = np.flatnonzero(kind >= 0)
+    onset = np.full(n, np.inf)
+    np.minimum.at(onset, tid[on], t[on])
+    onset[np.isinf(onset)] = np.nan
+    protocol = np.full(n, "", dtype=proto_of.dtype if len(proto_of) else "U2")
+    protocol[tid[on[::-1]]] = proto_of[pcode[on[::-1]]]   # reversed: the first onset wins
+
+    iti = np.full(n, np.nan)
+    r = np.flatnonzero(phase == "iti"); iti[tid[r]] = ev["rt_from_phase"][r]
+    a = np.flatnonzero(is_ans)
+    rt, t_ans = np.full(n, np.nan), np.full(n, np.nan)
+    rt[tid[a]], t_ans[tid[a]] = ev["rt_from_phase"][a], t[a]
+    choice = np.full(n, "", dtype=ev["choice"].dtype); choice[tid[a]] = ev["choice"][a]
+    logged = np.full(n, "", dtype=ev["correct"].dtype); logged[tid[a]] = ev["correct"][a]
+
+    # question id: v1 logs carry it, v2 logs are identified by <year>_<number>
+    year, number = ev["question_year"][first], ev["question_number"][first]
+    qid = np.where(ev["question_id"][first] != "", ev["question_id"][first],
+                   np.where(year != "", np.char.add(np.char.add(year, "_"), number), number))
+    part = np.array([s[0] for s in sessions], dtype=str)
+    files = np.array([s[1] for s in sessions], dtype=str)
+    sess = ev["session"][first]
+    return {
+        "participant": part[sess], "session_file": files[sess], "protocol": protocol,
+        "block": ev["block"][first], "trial": trial[first], "question_id": qid,
+        "question_type": ev["question_type"][first], "question_field": ev["question_field"][first],
+        "iti_s": iti, "reading_s": durs[0], "stem_s": durs[1], "options_s": durs[2],
+        "total_s": t_ans - onset, "revisits": np.bincount(tid[is_back], minlength=n), "rt_s": rt,
+        "choice": choice, "correct_logged": logged,
+    }
+
+
+# ===== questions and answer key =====
+def load_questions(path):
+    """{question_id: (text words, stem words, correct letter)} from the bank JSON or a trial CSV."""
+    out = {}
+    if path.lower().endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            for q in json.load(f):
+                qid = f"{q.get('year', '')}_{q.get('question_number', '')}"
+                out[qid] = (len(str(q.get("question_text_translated") or "").split()),
+                            len(str(q.get("question_itself_translated") or "").split()),
+                            str(q.get("correct") or "").strip().upper())
+    else:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                out[(row.get("question_id") or "").strip()] = (
+                    0, len((row.get("stem") or "").split()), (row.get("correct") or "").strip().upper())
+    return out
+
+
+def load_key(path):
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return {(r.get("question_id") or "").strip(): (r.get("correct") or "").strip().upper()
+                for r in csv.DictReader(f)}
+
+
+def add_question_metrics(trials, questions=None, key=None):
+    """Adds reading_wps, stem_wps and correct_key (1.0/0.0, NaN when unscored) in place."""
+    ids, inv = np.unique(trials["question_id"], return_inverse=True)
+    info = [(questions or {}).get(i, (0, 0, "")) for i in ids]   # one lookup per distinct question
+    text_w = np.array([x[0] for x in info], dtype=np.float64)[inv]
+    stem_w = np.array([x[1] for x in info], dtype=np.float64)[inv]
+    letters = np.array([(key or {}).get(i) or x[2] for i, x in zip(ids, info)] or [""], dtype=str)[inv]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        trials["reading_wps"] = np.where((text_w > 0) & (trials["reading_s"] > 0), text_w / trials["reading_s"], np.nan)
+        trials["stem_wps"] = np.where((stem_w > 0) & (trials["stem_s"] > 0), stem_w / trials["stem_s"], np.nan)
+    answered = trials["choice"] != ""
+    logged = trials["correct_logged"]
+    from_log = np.where(logged == "True", 1.0, np.where(logged == "False", 0.0, np.nan))
+    trials["correct_key"] = np.where(letters != "", np.where(answered, (trials["choice"] == letters) * 1.0, np.nan),
+                                     from_log)
+    return trials
+
+
+def accuracy(trials, by=("participant", "question_type")):
+    """[(group..., n scored, accuracy)] over the scored trials."""
+    scored = np.isfinite(trials["correct_key"])
+    if not scored.any(): return []
+    labels = np.array(["\x1f".join(x) for x in zip(*(trials[c][scored] for c in by))], dtype=str)
+    groups, g = np.unique(labels, return_inverse=True)
+    n = np.bincount(g, minlength=len(groups))
+    hits = np.bincount(g, weights=trials["correct_key"][scored], minlength=len(groups))
+    return [tuple(lbl.split("\x1f")) + (int(k), h / k) for lbl, k, h in zip(groups, n, hits)]
+
+
+def write_metrics(trials, out_path):
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    cols = [trials[c] for c in METRIC_COLUMNS]
+    fmt = [(lambda a: np.where(np.isfinite(a), np.char.mod("%.6f", a), "")) if a.dtype.kind == "f" else
+           (lambda a: a.astype(str)) for a in cols]
+    with open(out_path, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(METRIC_COLUMNS)
+        w.writerows(zip(*(fn(a) for fn, a in zip(fmt, cols))))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-trial phase durations, reading rates and accuracy.")
+    ap.add_argument("--logs", default=os.path.join(BASE_DIR, "logs"), help="logs directory")
+    ap.add_argument("--questions", default=None, help="bank JSON or trial CSV (word counts, correct letters)")
+    ap.add_argument("--key", default=None, help="answer key CSV: question_id,correct")
+    ap.add_argument("-o", "--out", default=None, help="metrics table (default <logs>/aggregate/metrics.csv)")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    ev, sessions = load_events(session_logs(args.logs))
+    t1 = time.perf_counter()
+    trials = derive(ev, sessions)
+    add_question_metrics(trials, load_questions(args.questions) if args.questions else None,
+                         load_key(args.key) if args.key else None)
+    t2 = time.perf_counter()
+    out = args.out or os.path.join(args.logs, "aggregate", "metrics.csv")
+    write_metrics(trials, out)
+    print(f"[METRICS] {len(sessions)} sessions, {len(ev['t_abs'])} events -> {len(trials['trial'])} trials "
+          f"(load {t1 - t0:.2f}s, derive {t2 - t1:.3f}s) -> {out}")
+    for row in accuracy(trials):
+        print(f"[METRICS] {' / '.join(x or '-' for x in row[:-2])}: {row[-1]:.0%} of {row[-2]}")
+
+
+if __name__ == "__main__":
+    main()